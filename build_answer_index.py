@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Script to build the memory-mapped snapshot of the validated answers that
+searches read when ANSWER_INDEX is enabled. Answers added since the last
+build are appended as a new segment, unless --full is given. With --watch,
+the snapshot is updated periodically, so it stays close to the vector database.
+"""
+import argparse
+import time
+from config import DEFAULT_NAMESPACE, ANSWER_INDEX_DTYPE, ANSWER_INDEX_REFRESH_INTERVAL
+from services.vector_db import VectorDBService
+
+def build(namespaces, dtype, full, compact):
+    for namespace in namespaces:
+        try:
+            count = VectorDBService(namespace=namespace).refresh_answer_index(dtype=dtype, full=full, compact=compact)
+            print(f"Namespace '{namespace}': {count} documents indexed ({dtype})")
+        except Exception as e:
+            print(f"Warning: Error building the answer index of namespace '{namespace}': {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds the quantized answer index from the vector database.")
+    parser.add_argument("--namespace", action="append",
+                        help=f"Namespace to index, can be repeated (default: {DEFAULT_NAMESPACE})")
+    parser.add_argument("--dtype", choices=["int8", "float16"], default=ANSWER_INDEX_DTYPE,
+                        help=f"Vector quantization (default: {ANSWER_INDEX_DTYPE})")
+    parser.add_argument("--full", action="store_true", help="Rebuilds every row instead of only the new answers")
+    parser.add_argument("--compact", action="store_true", help="Merges the segments of the snapshot into one")
+    parser.add_argument("--watch", type=float, nargs="?", const=ANSWER_INDEX_REFRESH_INTERVAL, metavar="SECONDS",
+                        help=f"Keeps updating the snapshot every SECONDS (default: {ANSWER_INDEX_REFRESH_INTERVAL})")
+    args = parser.parse_args()
+    namespaces = args.namespace or [DEFAULT_NAMESPACE]
+
+    build(namespaces, args.dtype, args.full, args.compact)
+    while args.watch:
+        time.sleep(args.watch)
+        build(namespaces, args.dtype, False, False)
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import openai
 
 from dotenv import find_dotenv, load_dotenv
 import os
+import socket
 
 load_dotenv(override=True)
 
@@ -11,10 +12,118 @@ openai.api_key = OPENAI_API_KEY
 
 LLM_MODEL = "gpt-4"
 
+# Per-operation models (default to LLM_MODEL)
+GENERATE_MODEL = os.getenv("GENERATE_MODEL", LLM_MODEL)
+ADAPT_MODEL = os.getenv("ADAPT_MODEL", LLM_MODEL)
+REGENERATE_MODEL = os.getenv("REGENERATE_MODEL", LLM_MODEL)
+
+# Optional routing policy: fast model for adaptation and short-feedback
+# regenerations, escalating to REGENERATE_MODEL when a fast answer is rejected
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "false").lower() in ["1", "true", "yes"]
+FAST_LLM_MODEL = os.getenv("FAST_LLM_MODEL", "gpt-4o-mini")
+SHORT_FEEDBACK_MAX_WORDS = 12
+
 VECTOR_DB_PATH = "./chroma_db"
 
+# Namespaces (per product, team or language) map to separate collections.
+# The "default" namespace keeps using Chroma's default collection, whatever
+# namespace QA_NAMESPACE selects.
+LEGACY_NAMESPACE = "default"
+DEFAULT_NAMESPACE = os.getenv("QA_NAMESPACE", LEGACY_NAMESPACE)
+DEFAULT_COLLECTION_NAME = "langchain"
+NAMESPACE_COLLECTION_PREFIX = "qa_"
+MAX_PARALLEL_NAMESPACE_SEARCHES = 4
+
+# Embedding model for new collections. Existing collections keep the model
+# recorded in the registry until they are migrated with reembed_chroma_db.py
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+# Model of the collections created before the registry, registered on first use
+LEGACY_EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_REGISTRY_PATH = "embedding_registry.sqlite"
+# Seconds a service reuses the active collection of a namespace for searches (writes always read it again)
+ACTIVE_COLLECTION_CHECK_INTERVAL = 5
+REEMBED_BATCH_SIZE = 64
+
+# Read-optimized snapshot of each namespace's answers: quantized vectors in a
+# memory-mapped file, shared by all processes through the page cache
+# (built outside the request path with build_answer_index.py, e.g. --watch)
+ANSWER_INDEX_ENABLED = os.getenv("ANSWER_INDEX", "false").lower() in ["1", "true", "yes"]
+ANSWER_INDEX_DIR = "./answer_index"
+ANSWER_INDEX_DTYPE = os.getenv("ANSWER_INDEX_DTYPE", "int8")  # "int8" or "float16"
+ANSWER_INDEX_BATCH_SIZE = 256
+ANSWER_INDEX_SEARCH_CHUNK = 4096  # Rows scored at a time, bounding the memory of a search
+ANSWER_INDEX_MAX_SEGMENTS = 8  # Segments are merged into one beyond this
+ANSWER_INDEX_SEGMENT_GRACE_SECONDS = 600  # Merged segments are kept this long for processes still reading them
+ANSWER_INDEX_REFRESH_INTERVAL = 60  # Seconds between builds with build_answer_index.py --watch
+
 SQLITE_DB_PATH = "checkpoints.sqlite"
 
+# "interrupt": checkpoints are only persisted when the flow stops for review and at the end
+# "sync": every step is persisted (full history, e.g. for replay_checkpoints.py)
+CHECKPOINT_DURABILITY = os.getenv("CHECKPOINT_DURABILITY", "interrupt")
+
+# Graph visualization is rendered by visualize_graph.py, or on every build if enabled
+GRAPH_IMAGE_PATH = "qa_feedback_graph.png"
+VISUALIZE_GRAPH_ON_BUILD = os.getenv("VISUALIZE_GRAPH_ON_BUILD", "false").lower() in ["1", "true", "yes"]
+
+# Profiling of graph runs (also enabled for every run with `python main.py --profile`)
+PROFILE_ENABLED = os.getenv("QA_PROFILE", "false").lower() in ["1", "true", "yes"]
+PROFILE_SAMPLE_RATE = float(os.getenv("QA_PROFILE_SAMPLE_RATE", "0"))
+PROFILER = os.getenv("QA_PROFILER", "cprofile")  # "cprofile" (deterministic) or "pyinstrument" (statistical)
+PROFILE_DIR = os.getenv("QA_PROFILE_DIR", "./profiles")
+
+# Job queue for running generation and regeneration in worker processes (workers.py)
+JOB_QUEUE_DB_PATH = "jobs.sqlite"
+JOB_LEASE_SECONDS = 300
+JOB_MAX_ATTEMPTS = 3
+JOB_POLL_INTERVAL = 0.5
+JOB_HEARTBEAT_INTERVAL = 30  # Workers renew the lease of a running job this often
+JOB_WAIT_TIMEOUT = int(os.getenv("JOB_WAIT_TIMEOUT", "600"))  # How long main.py --queue waits for a job
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "4"))
+
+# Pending-review queue (stored in the checkpoint database)
+REVIEW_LEASE_SECONDS = 15 * 60
+REVIEW_MAX_AGE_SECONDS = 7 * 24 * 3600  # Unclaimed threads not updated for this long are removed
+# Reviewer id the CLI claims the threads it reviews under
+CLI_REVIEWER = os.getenv("QA_REVIEWER", f"cli-{socket.gethostname()}-{os.getpid()}")
+REVIEW_PAGE_SIZE = 20
+REVIEW_PREVIEW_LENGTH = 200
+
+# Speculative work while a response waits for review (opt-in): prefetches the
+# embeddings used to store it and a concise variant for "make it shorter" feedback
+SPECULATION_ENABLED = os.getenv("QA_SPECULATION", "false").lower() in ["1", "true", "yes"]
+SPECULATION_DB_PATH = "speculation.sqlite"
+SPECULATION_MAX_CALLS_PER_HOUR = int(os.getenv("SPECULATION_MAX_CALLS_PER_HOUR", "30"))
+SPECULATION_MIN_RESPONSE_WORDS = 120  # Shorter responses don't get a concise variant
+SPECULATION_MAX_WORKERS = 2
+SPECULATION_WAIT_SECONDS = 30  # How long regeneration waits for a variant still being generated
+SPECULATION_TTL_SECONDS = 24 * 60 * 60
+# The concise variant is only served when the feedback consists of these
+# phrases and filler words, so negations ("not shorter"), complaints ("too
+# brief") and any other instruction ("shorter, and add pricing") regenerate
+SPECULATION_CONCISE_PHRASES = [
+    "shorter", "shorten", "shorten it", "more concise", "concise", "too long", "way too long",
+    "briefer", "more brief", "be brief", "keep it brief", "make it brief", "more succinct",
+    "succinct", "summarize", "summarise", "summarize it", "less verbose", "too verbose",
+    "too wordy", "less wordy", "tl;dr", "tldr", "cut it down", "trim it", "trim it down"
+]
+SPECULATION_FILLER_WORDS = [
+    "please", "pls", "make", "it", "its", "it's", "the", "answer", "response", "this", "is",
+    "too", "a", "bit", "little", "lot", "much", "way", "can", "could", "you", "be", "keep",
+    "just", "and", "so", "should", "thanks", "thank", "i", "would", "like", "prefer", "ok", "okay"
+]
+
 SIMILARITY_THRESHOLD = 0.5
+# Questions this close to a stored question (or one of its aliases) get the stored answer as is.
+# Off by default: questions that only differ by an entity ("capital of Argentina" and "of Brazil")
+# are this close too, so raise it only after checking such pairs against EMBEDDING_MODEL
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0"))
 MAX_SIMILAR_RESULTS = 2
-MAX_RETRY_ATTEMPTS = 3
\ No newline at end of file
+# Extra candidates fetched per result, since several aliases of one answer can match
+ALIAS_SEARCH_FACTOR = 3
+MAX_RETRY_ATTEMPTS = 3
+
+# Prompt construction limits (in tokens)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+STORED_RESPONSE_TOKEN_BUDGET = int(os.getenv("STORED_RESPONSE_TOKEN_BUDGET", "1500"))
+MAX_PREVIOUS_ATTEMPTS_IN_PROMPT = 2
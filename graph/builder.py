@@ -2,24 +2,123 @@
 Flow graph builder for the QA system with feedback.
 """
 import sqlite3
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 from langgraph.checkpoint.sqlite import SqliteSaver
 from graph.state import State
-from nodes.generate_response import generate_llm_response
+from nodes.generate_response import generate_llm_response, GenerateResponseNode
 from nodes.human_feedback import get_human_feedback
-from nodes.evaluate import evaluate_feedback
-from nodes.regenerate import regenerate_response
-from nodes.storage import save_validated_response
-from config import SQLITE_DB_PATH
+from nodes.evaluate import route_feedback, is_attempt_limit_reached
+from nodes.regenerate import regenerate_response, RegenerateResponseNode
+from nodes.storage import save_validated_response, StoreValidatedResponseNode
+from config import SQLITE_DB_PATH, VISUALIZE_GRAPH_ON_BUILD, CHECKPOINT_DURABILITY, SPECULATION_ENABLED
+from graph.checkpointer import DeferredCheckpointSaver
 from services.visualization import VisualizationService
+from services.review_queue import ReviewQueue
+from services.speculation import get_speculation_service
+from services.vector_db import VectorDBService
+
+# Nodes after which the flow stops at the human feedback interrupt
+REVIEW_PENDING_NODES = ["generate_llm_response", "regenerate_response"]
 
 class GraphBuilder:
-    def __init__(self):
-        """Initializes the graph builder."""
+    def __init__(self, db_path=SQLITE_DB_PATH, llm_service=None, vector_db_service=None, node_wrapper=None,
+                 visualize=VISUALIZE_GRAPH_ON_BUILD, durability=CHECKPOINT_DURABILITY, speculate=SPECULATION_ENABLED):
+        """
+        Initializes the graph builder.
+        
+        Args:
+            db_path: Checkpoint database path
+            llm_service: LLM service shared by the nodes (each node creates its own by default)
+            vector_db_service: Vector database service shared by the nodes (same as above)
+            node_wrapper: Optional function (node_name, node_function) -> node_function
+                used to instrument every node
+            visualize: Generates the graph visualization on build (see visualize_graph.py)
+            durability: "sync" persists every step, "interrupt" only the checkpoint
+                where each run stops (see DeferredCheckpointSaver)
+            speculate: Prepares likely follow-up work while a response waits for review
+                (see SpeculationService, shared by the graphs of the process)
+        """
         self.builder = StateGraph(State)
-        self.conn = sqlite3.connect(SQLITE_DB_PATH, check_same_thread=False)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.memory = SqliteSaver(self.conn)
+        if durability == "interrupt":
+            self.memory = DeferredCheckpointSaver(self.memory)
+        self.review_queue = ReviewQueue(db_path)
         self.visualization_service = VisualizationService()
+        self.llm_service = llm_service
+        self.vector_db_service = vector_db_service
+        self.node_wrapper = node_wrapper
+        self.visualize = visualize
+        self.speculation_service = get_speculation_service() if speculate else None
+        self.regenerate_node = None
+    
+    def _get_nodes(self):
+        """Returns the node functions, bound to the shared services when they are given."""
+        nodes = {
+            "generate_llm_response": generate_llm_response,
+            "get_human_feedback": get_human_feedback,
+            "regenerate_response": regenerate_response,
+            "save_validated_response": save_validated_response
+        }
+        
+        if self.llm_service or self.vector_db_service or self.speculation_service:
+            # The stored answer reads the embeddings prefetched while it was reviewed
+            store_vector_db_service = self.vector_db_service
+            if self.speculation_service and store_vector_db_service is None:
+                store_vector_db_service = VectorDBService(cache_embeddings=True)
+            
+            nodes["generate_llm_response"] = GenerateResponseNode(
+                vector_db_service=self.vector_db_service,
+                llm_service=self.llm_service
+            ).execute
+            self.regenerate_node = RegenerateResponseNode(
+                llm_service=self.llm_service,
+                speculation_service=self.speculation_service
+            )
+            nodes["regenerate_response"] = self.regenerate_node.execute
+            nodes["save_validated_response"] = StoreValidatedResponseNode(
+                vector_db_service=store_vector_db_service
+            ).execute
+        
+        if self.node_wrapper:
+            nodes = {name: self.node_wrapper(name, function) for name, function in nodes.items()}
+        
+        return {name: self._track_review(name, function) for name, function in nodes.items()}
+    
+    def _track_review(self, name, function):
+        """
+        Keeps the pending-review queue in sync with the interrupt: threads are
+        added when a response is ready for review and removed once the
+        feedback is received. The speculative work starts and ends with the review.
+        """
+        if name in REVIEW_PENDING_NODES:
+            def node(state: State, config: RunnableConfig):
+                result = function(state)
+                self.review_queue.mark_pending(
+                    config["configurable"]["thread_id"],
+                    result["question"],
+                    len(result.get("feedback_history", [])) + 1,
+                    result.get("llm_response", "")
+                )
+                if self.speculation_service:
+                    self.speculation_service.speculate(result, self.regenerate_node.regenerate)
+                return result
+            return node
+        
+        if name == "get_human_feedback":
+            # Only returns once resumed with the feedback (the interrupt raises before)
+            def node(state: State, config: RunnableConfig):
+                result = function(state)
+                self.review_queue.mark_resolved(config["configurable"]["thread_id"])
+                # Same check as route_feedback, which also logs the routing
+                is_final = result["is_validated"] or is_attempt_limit_reached(result)
+                if self.speculation_service and is_final:
+                    self.speculation_service.discard(result)
+                return result
+            return node
+        
+        return function
     
     def build(self):
         """
@@ -27,30 +126,25 @@ class GraphBuilder:
         
         Main flow:
         1. Start -> generate_llm_response: Generates an initial response
-        2. generate_llm_response -> get_human_feedback: Gets human feedback
-        3. get_human_feedback -> evaluate_feedback: Evaluates feedback
-        4a. evaluate_feedback -> save_validated_response: If validated
-        4b. evaluate_feedback -> regenerate_response: If not validated (up to 3 attempts)
-        4c. evaluate_feedback -> END: If rejected more than 3 times
-        5a. regenerate_response -> get_human_feedback: Get feedback for the new response
-        5b. save_validated_response -> END: Ends the flow after saving
+        2. generate_llm_response -> get_human_feedback: Interrupts until resumed with the feedback
+        3a. get_human_feedback -> save_validated_response: If validated
+        3b. get_human_feedback -> regenerate_response: If not validated (up to MAX_RETRY_ATTEMPTS responses)
+        3c. get_human_feedback -> END: If the last attempt is rejected
+        4a. regenerate_response -> get_human_feedback: Get feedback for the new response
+        4b. save_validated_response -> END: Ends the flow after saving
         """
         # Adds the nodes
-        self.builder.add_node("generate_llm_response", generate_llm_response)
-        self.builder.add_node("get_human_feedback", get_human_feedback)
-        self.builder.add_node("evaluate_feedback", evaluate_feedback)
-        self.builder.add_node("regenerate_response", regenerate_response)
-        self.builder.add_node("save_validated_response", save_validated_response)
+        for name, function in self._get_nodes().items():
+            self.builder.add_node(name, function)
         
         # Adds the edges
         self.builder.add_edge(START, "generate_llm_response")
         self.builder.add_edge("generate_llm_response", "get_human_feedback")
-        self.builder.add_edge("get_human_feedback", "evaluate_feedback")
         
         # Adds conditional edges based on feedback evaluation
         self.builder.add_conditional_edges(
-            "evaluate_feedback",
-            lambda x: x["next"],
+            "get_human_feedback",
+            route_feedback,
             {
                 "save_validated_response": "save_validated_response",
                 "regenerate_response": "regenerate_response",
@@ -63,12 +157,20 @@ class GraphBuilder:
         self.builder.add_edge("save_validated_response", END)
         
         # Compiles the graph
-        self.graph = self.builder.compile(
-            checkpointer=self.memory, 
-            interrupt_before=["get_human_feedback"]
-        )
+        self.graph = self.builder.compile(checkpointer=self.memory)
+        if isinstance(self.memory, DeferredCheckpointSaver):
+            self.memory.wrap_graph(self.graph)
         
-        # Generates graph visualization
-        self.visualization_service.generate_graph_image(self.graph)
+        # Generates graph visualization (cached by topology, no network access)
+        if self.visualize:
+            self.visualization_service.generate_graph_image(self.graph)
         
-        return self.graph
\ No newline at end of file
+        return self.graph
+    
+    def run(self, graph_input, thread):
+        """
+        Runs the graph until it stops for review or ends, and returns the
+        streamed state values. graph_input is the initial state or a
+        Command(resume=feedback) for a thread waiting for review.
+        """
+        return list(self.graph.stream(graph_input, thread, stream_mode="values"))
\ No newline at end of file
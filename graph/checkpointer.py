@@ -0,0 +1,148 @@
+"""
+Checkpointer that only persists checkpoints at interrupt boundaries and at the end of a run.
+"""
+import threading
+from langgraph.checkpoint.base import BaseCheckpointSaver, CheckpointTuple
+from langgraph.constants import INTERRUPT
+
+class DeferredCheckpointSaver(BaseCheckpointSaver):
+    """
+    Wraps a checkpointer and keeps the checkpoints and writes of a run in
+    memory, so only the checkpoint where the run stops (with its pending
+    writes) is persisted. The run is flushed when a node raises the human
+    feedback interrupt, and when the stream of a graph returned by
+    wrap_graph() ends (at the end of the flow or on an error).
+
+    Intermediate checkpoints, and the writes made against them or against the
+    last persisted checkpoint (e.g. the resume value), are not persisted, so
+    the thread history only has one checkpoint per run. A crash during a run
+    resumes from the last flushed checkpoint.
+    """
+    def __init__(self, saver):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        # thread_id -> {"parent_config", "checkpoint", "new_versions", "writes"}:
+        # parent_config is the last persisted checkpoint, checkpoint the latest
+        # deferred one (None until the run puts one), writes {checkpoint_id: [...]}
+        self.pending = {}
+        # Writes are put from the graph's background threads
+        self.lock = threading.Lock()
+
+    def _thread_id(self, config):
+        return config["configurable"]["thread_id"]
+
+    def _get_pending(self, config):
+        return self.pending.setdefault(self._thread_id(config), {
+            "parent_config": config,
+            "checkpoint": None,
+            "new_versions": {},
+            "writes": {}
+        })
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved_config = {
+            "configurable": {
+                "thread_id": self._thread_id(config),
+                "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+                "checkpoint_id": checkpoint["id"]
+            }
+        }
+        with self.lock:
+            pending = self._get_pending(config)
+            pending["checkpoint"] = {"config": saved_config, "checkpoint": checkpoint, "metadata": metadata}
+            # Versions of every step, since only the last checkpoint is persisted
+            pending["new_versions"] = {**pending["new_versions"], **new_versions}
+        return saved_config
+
+    def put_writes(self, config, writes, task_id, *args, **kwargs):
+        checkpoint_id = config["configurable"].get("checkpoint_id")
+        with self.lock:
+            pending = self._get_pending(config)
+            pending["writes"].setdefault(checkpoint_id, []).append((config, writes, task_id, args, kwargs))
+            # The run stops at the interrupt, so its checkpoint is persisted right away
+            interrupted = any(channel == INTERRUPT for channel, _ in writes) and \
+                pending["checkpoint"] is not None and pending["checkpoint"]["checkpoint"]["id"] == checkpoint_id
+        if interrupted:
+            self.flush(self._thread_id(config))
+
+    def _buffered_writes(self, pending, checkpoint_id):
+        return [
+            (task_id, channel, value)
+            for _, writes, task_id, _, _ in pending["writes"].get(checkpoint_id, [])
+            for channel, value in writes
+        ]
+
+    def get_tuple(self, config):
+        checkpoint_id = config["configurable"].get("checkpoint_id")
+        with self.lock:
+            pending = self.pending.get(self._thread_id(config))
+            deferred = pending["checkpoint"] if pending else None
+            if deferred and checkpoint_id in (None, deferred["checkpoint"]["id"]):
+                parent_id = pending["parent_config"]["configurable"].get("checkpoint_id")
+                return CheckpointTuple(
+                    config=deferred["config"],
+                    checkpoint=deferred["checkpoint"],
+                    metadata=deferred["metadata"],
+                    parent_config=pending["parent_config"] if parent_id else None,
+                    pending_writes=self._buffered_writes(pending, deferred["checkpoint"]["id"])
+                )
+
+        saved = self.saver.get_tuple(config)
+        if saved and pending:
+            with self.lock:
+                buffered = self._buffered_writes(pending, saved.config["configurable"]["checkpoint_id"])
+            if buffered:
+                saved = saved._replace(pending_writes=list(saved.pending_writes or []) + buffered)
+        return saved
+
+    def list(self, config, *args, **kwargs):
+        return self.saver.list(config, *args, **kwargs)
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+    def flush(self, thread_id=None):
+        """
+        Persists the latest checkpoint of a thread (or of every thread) with
+        its writes. Without a new checkpoint, the writes made against the last
+        persisted one are persisted instead.
+        """
+        with self.lock:
+            thread_ids = [thread_id] if thread_id else list(self.pending)
+            flushed = [self.pending.pop(pending_thread_id, None) for pending_thread_id in thread_ids]
+
+        for pending in flushed:
+            if pending is None:
+                continue
+
+            deferred = pending["checkpoint"]
+            if deferred:
+                saved_config = self.saver.put(
+                    pending["parent_config"],
+                    deferred["checkpoint"],
+                    deferred["metadata"],
+                    pending["new_versions"]
+                )
+                for _, writes, task_id, args, kwargs in pending["writes"].get(deferred["checkpoint"]["id"], []):
+                    self.saver.put_writes(saved_config, writes, task_id, *args, **kwargs)
+            else:
+                parent_id = pending["parent_config"]["configurable"].get("checkpoint_id")
+                for config, writes, task_id, args, kwargs in pending["writes"].get(parent_id, []):
+                    self.saver.put_writes(config, writes, task_id, *args, **kwargs)
+
+    def wrap_graph(self, graph):
+        """
+        Makes a compiled graph flush the thread when each stream (or invoke,
+        which streams) stops, so callers never leave a run unpersisted.
+        """
+        stream = graph.stream
+
+        def flushed_stream(input, config=None, *args, **kwargs):
+            try:
+                yield from stream(input, config, *args, **kwargs)
+            finally:
+                configurable = (config or {}).get("configurable", {})
+                self.flush(configurable.get("thread_id"))
+
+        graph.stream = flushed_stream
+        return graph
@@ -8,15 +8,21 @@ class State(TypedDict):
     Definition of the state used in the flow graph of the QA system with feedback.
     """
     question: str                    # Current question
+    namespace: str                   # Knowledge base namespace (product, team, language)
+    search_namespaces: List[str]     # Namespaces to search (defaults to namespace)
     llm_response: str                # Response generated by the LLM
+    llm_model: str                   # Model that produced llm_response
     human_feedback: str              # Human feedback (validated/rejected)
     is_validated: bool               # If the response was validated
     previous_responses: List[str]    # List of previous responses
     feedback_notes: str              # Additional feedback notes
+    feedback_history: List[str]      # Feedback notes from every rejection round
     from_database: bool              # If the response came from the database
     adapted_response: str            # Adapted response (if applicable)
     original_question: str           # Original question (if adapted)
+    answer_id: str                   # Id of the stored answer (if from the database or adapted from it)
     is_identical: bool               # If it's a question identical to an existing one
+    is_near_duplicate: bool          # If it's a rewording close enough to reuse the stored answer
 
 # Exports the class so it can be imported from other modules
 __all__ = ['State']
\ No newline at end of file
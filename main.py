@@ -3,7 +3,12 @@ Main entry point for the QA system with feedback.
 """
 import sys
 import traceback
+from langgraph.types import Command
 from graph.builder import GraphBuilder
+from nodes.evaluate import is_attempt_limit_reached
+from config import DEFAULT_NAMESPACE, CLI_REVIEWER
+from services.profiler import RunProfiler, should_profile, paused
+from services.job_queue import QueuedGraphRunner
 from utils.helpers import (
     create_initial_state,
     create_thread_config,
@@ -16,23 +21,50 @@ from utils.helpers import (
     print_welcome_message
 )
 
-def run_qa_feedback_system(question):
+def run_qa_feedback_system(question, namespace=DEFAULT_NAMESPACE, profile=False, use_queue=False):
     """
     Runs the QA system with feedback for a specific question.
     
     Args:
         question: The user's question
+        namespace: Knowledge base namespace to search and store answers in
+        profile: Profiles this run (runs are also profiled when QA_PROFILE
+            is set, or sampled with QA_PROFILE_SAMPLE_RATE)
+        use_queue: Runs generation and regeneration in the worker processes
+            started by workers.py instead of in this process
     """
     if not question.strip():
         print("\nQuestion shouldn't be empty.")
         return
     
+    if should_profile(profile):
+        with RunProfiler("qa") as profiler:
+            return _run_qa_feedback_system(question, namespace, use_queue, profiler)
+    
+    return _run_qa_feedback_system(question, namespace, use_queue)
+
+def _hold_review(review_queue, thread_id):
+    """
+    Claims the thread under the CLI's reviewer id, or renews the claim, before
+    the answer is reviewed or its feedback sent. Fails if another reviewer holds it.
+    """
+    if review_queue.claim(thread_id, CLI_REVIEWER):
+        return True
+    print("\nThis answer is being reviewed by another reviewer (see pending_reviews.py).")
+    return False
+
+def _run_qa_feedback_system(question, namespace, use_queue=False, profiler=None):
+    """Runs the QA flow, timing nodes and checkpoint writes when a profiler is given."""
     # Initialize the graph
-    builder = GraphBuilder()
+    builder = GraphBuilder(node_wrapper=profiler.wrap_node if profiler else None)
+    if profiler:
+        # Times the actual writes, behind the deferred checkpointer if enabled
+        profiler.instrument_checkpointer(getattr(builder.memory, "saver", builder.memory))
     graph = builder.build()
+    runner = QueuedGraphRunner(graph) if use_queue else builder
     
     # Create the initial state and thread configuration
-    initial_state = create_initial_state(question)
+    initial_state = create_initial_state(question, namespace)
     thread = create_thread_config()
     
     print(f"\nNew question: {question}\n")
@@ -40,12 +72,13 @@ def run_qa_feedback_system(question):
     
     try:
         # Executes the initial flow until the interruption point (human_feedback)
-        events = list(graph.stream(initial_state, thread, stream_mode="values"))
+        events = runner.run(initial_state, thread)
         
         llm_response = None
         from_database = False
         original_question = ""
         is_identical = False
+        is_near_duplicate = False
         
         # Extract information from the most recent event
         for event in events:
@@ -54,135 +87,91 @@ def run_qa_feedback_system(question):
                 from_database = event.get("from_database", False)
                 original_question = event.get("original_question", "")
                 is_identical = event.get("is_identical", False)
+                is_near_duplicate = event.get("is_near_duplicate", False)
         
         if not llm_response:
             print("\nError: Could not generate a response.")
             return
         
+        thread_id = thread["configurable"]["thread_id"]
+        if not _hold_review(builder.review_queue, thread_id):
+            return
+        
         # Display the response with appropriate format
         if from_database:
             if is_identical:
                 print(f"\nIdentical question found!")
                 print(format_display_response(llm_response, "database"))
+            elif is_near_duplicate:
+                print(f"\nNear-duplicate question found!")
+                print(format_display_response(llm_response, "near_duplicate", original_question))
             else:
                 print(format_display_response(llm_response, "adapted", original_question))
         else:
             print("\nAnswer by LLM:")
             print(format_display_response(llm_response, "generated"))
         
-        # Request feedback from the user
-        print(format_feedback_prompt())
-        
-        is_valid = get_yes_no_input("\nThe answer is valid? (yes/no): ")
-        
-        if is_valid:
-            feedback_notes = ""
+        # Request feedback for each response until it is validated or the attempt limit is reached
+        while True:
+            print(format_feedback_prompt())
             
-            # Update the state with positive feedback
-            graph.update_state(
-                thread, 
-                {
-                    "human_feedback": "validated",
-                    "is_validated": True,
-                    "feedback_notes": feedback_notes
-                }, 
-                as_node="get_human_feedback"
-            )
+            with paused(profiler):
+                is_valid = get_yes_no_input("\nThe answer is valid? (yes/no): ")
             
-            print("\nSaving answer...")
-            next_events = list(graph.stream(None, thread, stream_mode="values"))
+            if not _hold_review(builder.review_queue, thread_id):
+                return
             
-            print(format_success_message())
+            if is_valid:
+                print("\nSaving answer...")
+                runner.run(Command(resume={"is_validated": True, "feedback_notes": ""}), thread)
+                print(format_success_message())
+                return
             
-            return
-        
-        # Handle negative feedback and regeneration
-        attempt_count = 1  # Already showed the first response
-        current_response = llm_response
-        is_validated = False
-        
-        while attempt_count < 3 and not is_validated:
-            attempt_count += 1
+            # The graph ends the flow when the last attempt is rejected
+            if is_attempt_limit_reached(graph.get_state(thread).values):
+                runner.run(Command(resume={"is_validated": False, "feedback_notes": ""}), thread)
+                print(format_warning_message())
+                print(format_end_message())
+                return
             
-            feedback_notes = input("Explain what can be improved: ")
+            with paused(profiler):
+                feedback_notes = input("Explain what can be improved: ")
             if not feedback_notes.strip():
                 feedback_notes = "Answer doesn't meet expectations."
             
-            print(f"\nGenerating new answer based on feedback...")
-            
-            # Update the state with negative feedback
-            graph.update_state(
-                thread, 
-                {
-                    "human_feedback": "rejected",
-                    "is_validated": False,
-                    "feedback_notes": feedback_notes
-                }, 
-                as_node="get_human_feedback"
-            )
+            if not _hold_review(builder.review_queue, thread_id):
+                return
             
-            # Continue the flow
-            next_events = list(graph.stream(None, thread, stream_mode="values"))
+            print(f"\nGenerating new answer based on feedback...")
             
-            # Extract the new response
-            new_response = None
-            for event in next_events:
-                if isinstance(event, dict) and "llm_response" in event:
-                    new_response = event.get("llm_response")
-                    if new_response and new_response != current_response:
-                        current_response = new_response
-                        break
+            # Resumes the flow with the feedback, regenerating until the next review
+            runner.run(Command(resume={"is_validated": False, "feedback_notes": feedback_notes}), thread)
             
-            if not new_response:
+            state = graph.get_state(thread)
+            current_response = state.values.get("llm_response")
+            if not state.next or not current_response:
                 print("\nError generating new response.")
-                break
+                print(format_end_message())
+                return
+            
+            attempt_count = len(state.values.get("feedback_history", [])) + 1
             
             # Display the new response
             print(f"\nRegenerated answer (attempt {attempt_count}):")
             print(format_display_response(current_response, "generated"))
-            
-            # Request feedback for the new response
-            print(format_feedback_prompt())
-            
-            is_valid = get_yes_no_input("\nThe answer is valid (yes/no): ")
-            
-            if is_valid:
-                is_validated = True
-                feedback_notes = ""
-                
-                # Update the state with positive feedback
-                graph.update_state(
-                    thread, 
-                    {
-                        "human_feedback": "validated",
-                        "is_validated": True,
-                        "llm_response": current_response,
-                        "feedback_notes": feedback_notes
-                    }, 
-                    as_node="get_human_feedback"
-                )
-                
-                print("\nStoring in database...")
-                next_events = list(graph.stream(None, thread, stream_mode="values"))
-                
-                print(format_success_message())
-                
-                break
-            
-            if attempt_count >= 3:
-                print(format_warning_message())
-                break
-        
-        if not is_validated:
-            print(format_end_message())
     
     except Exception as e:
         print(f"\nError during execution: {str(e)}")
         traceback.print_exc()
         print("Please try again with a different question.")
+    finally:
+        # The thread leaves the queue once resolved; otherwise others can take it over
+        builder.review_queue.release(thread["configurable"]["thread_id"], CLI_REVIEWER)
 
 def main():
     """Main function that starts the system."""
+    profile = "--profile" in sys.argv[1:]
+    use_queue = "--queue" in sys.argv[1:]
     print_welcome_message()
     
     while True:
@@ -191,7 +180,7 @@ def main():
             print("\nFinishing system...")
             break
             
-        run_qa_feedback_system(question)
+        run_qa_feedback_system(question, profile=profile, use_queue=use_queue)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,5 +1,5 @@
 from nodes.generate_response import generate_llm_response
 from nodes.human_feedback import get_human_feedback
-from nodes.evaluate import evaluate_feedback
+from nodes.evaluate import evaluate_feedback, route_feedback
 from nodes.regenerate import regenerate_response
 from nodes.storage import save_validated_response
\ No newline at end of file
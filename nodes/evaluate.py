@@ -3,21 +3,27 @@ Node responsible for evaluating human feedback and deciding the next action.
 """
 from graph.state import State
 from langgraph.graph import END
+from config import MAX_RETRY_ATTEMPTS
+
+def is_attempt_limit_reached(state: State) -> bool:
+    """Checks if the response under review is the last attempt allowed."""
+    # feedback_history has one entry per response already rejected
+    return len(state.get("feedback_history", [])) + 1 >= MAX_RETRY_ATTEMPTS
 
 class EvaluateFeedbackNode:
     def execute(self, state: State) -> dict:
         """
         Evaluates human feedback and decides the next action:
         - If validated, saves the response
-        - If rejected, regenerates the response (up to 3 attempts)
-        - If rejected more than 3 times, ends the flow
+        - If rejected, regenerates the response (up to MAX_RETRY_ATTEMPTS responses)
+        - If the last attempt is rejected, ends the flow
         """
         print("Checking feedback")
         
         if state["is_validated"]:
             return {"next": "save_validated_response"}
         else:
-            if len(state.get("previous_responses", [])) >= 3:
+            if is_attempt_limit_reached(state):
                 return {"next": END}
             else:
                 return {"next": "regenerate_response"}
@@ -25,4 +31,8 @@ class EvaluateFeedbackNode:
 # Helper function to facilitate integration with the graph
 def evaluate_feedback(state: State) -> dict:
     node = EvaluateFeedbackNode()
-    return node.execute(state)
\ No newline at end of file
+    return node.execute(state)
+
+# Routing function used after the human feedback node
+def route_feedback(state: State) -> str:
+    return evaluate_feedback(state)["next"]
@@ -4,6 +4,8 @@ Node responsible for generating initial responses to questions.
 from graph.state import State
 from services.vector_db import VectorDBService
 from services.llm_service import LLMService
+from services.model_router import ModelRouter, GENERATE, ADAPT
+from config import DEFAULT_NAMESPACE, LEGACY_NAMESPACE, NEAR_DUPLICATE_THRESHOLD
 from dotenv import find_dotenv, load_dotenv
 import os
 
@@ -13,15 +15,18 @@ load_dotenv(env_file)
 print("Using .env file:", env_file)
 
 class GenerateResponseNode:
-    def __init__(self):
-        self.vector_db_service = VectorDBService()
-        self.llm_service = LLMService()
+    def __init__(self, vector_db_service=None, llm_service=None):
+        self.vector_db_service = vector_db_service or VectorDBService()
+        self.llm_service = llm_service or LLMService()
+        self.model_router = ModelRouter()
     
     def execute(self, state: State) -> State:
         """
         Executes the response generation node, which:
         1. Checks if there are similar validated responses in the database
-        2. If found, adapts the existing response to the new question
+        2. If found, returns it for identical or near-duplicate questions,
+           otherwise adapts the existing response to the new question
+           (answer_id keeps the id of the stored answer in both cases)
         3. If not found, generates a new response using the LLM
         """
         print("Verifying similar questions")
@@ -29,7 +34,11 @@ class GenerateResponseNode:
         question = state["question"]
         
         # Search for similar responses
-        similar_docs = self.vector_db_service.search_similar_responses(question)
+        namespace = state.get("namespace") or DEFAULT_NAMESPACE
+        similar_docs = self.vector_db_service.search_similar_responses(
+            question,
+            namespaces=state.get("search_namespaces") or [namespace]
+        )
         
         if similar_docs:
             doc, score = similar_docs[0]
@@ -40,41 +49,63 @@ class GenerateResponseNode:
             if "\n\nAdditional observations:" in validated_response:
                 validated_response = validated_response.split("\n\nAdditional observations:")[0]
             
-            # Check if the question is exactly identical
-            if original_question.strip().lower() == question.strip().lower():
-                print(f"Identical question found: '{original_question}'")
+            # Aliases and links can only point to answers of the thread's own namespace
+            # (answers stored before namespaces existed belong to the "default" one)
+            answer_id = ""
+            if doc.metadata.get("namespace", LEGACY_NAMESPACE) == namespace:
+                answer_id = doc.metadata.get("answer_id", "")
+            
+            # Check if the question is identical, or close enough to a stored question or alias
+            is_identical = original_question.strip().lower() == question.strip().lower()
+            if is_identical or score <= NEAR_DUPLICATE_THRESHOLD:
+                if is_identical:
+                    print(f"Identical question found: '{original_question}'")
+                else:
+                    print(f"Near-duplicate question found: '{original_question}'")
                 return {
                     **state,
                     "llm_response": validated_response,
+                    "llm_model": "",
                     "original_question": original_question,
+                    "answer_id": answer_id,
                     "from_database": True,
-                    "is_identical": True
+                    "is_identical": is_identical,
+                    "is_near_duplicate": not is_identical
                 }
             else:
                 # Automatically adapt the response for non-identical questions
                 print(f"Similar question found: '{original_question}'. Adapting...")
-                adapted_response = self.llm_service.adapt_response(question, original_question, validated_response)
+                model = self.model_router.select_model(ADAPT)
+                adapted_response = self.llm_service.adapt_response(
+                    question, original_question, validated_response, model=model
+                )
                 
                 return {
                     **state,
                     "llm_response": adapted_response,
+                    "llm_model": model,
                     "original_question": original_question,
+                    "answer_id": answer_id,
                     "from_database": True,
                     "is_identical": False,
+                    "is_near_duplicate": False,
                     "adapted_response": adapted_response
                 }
         
         # If no similar responses found, generate a new one        
         print("No answers found, generating new")
         
-        llm_response = self.llm_service.generate_response(question)
+        model = self.model_router.select_model(GENERATE)
+        llm_response = self.llm_service.generate_response(question, model=model)
         
         return {
             **state,
             "llm_response": llm_response,
+            "llm_model": model,
             "previous_responses": state.get("previous_responses", []) + [llm_response],
             "from_database": False,
-            "is_identical": False
+            "is_identical": False,
+            "is_near_duplicate": False
         }
 
 # Helper function to facilitate integration with the graph
@@ -1,19 +1,33 @@
 """
 Node responsible for collecting human feedback about the response.
 """
+from langgraph.types import interrupt
 from graph.state import State
 
 class HumanFeedbackNode:
     def execute(self, state: State) -> State:
         """
         This node is an interruption point in the graph.
-        It waits for human feedback, which will be provided
-        externally and updated in the state.
+        It pauses the flow until the graph is resumed with the human feedback
+        as the resume value: Command(resume={"is_validated": ..., "feedback_notes": ...})
         """
         print("Waiting for human feedback")
-        return state
+        
+        feedback = interrupt({
+            "question": state["question"],
+            "llm_response": state["llm_response"]
+        })
+        
+        is_validated = bool(feedback.get("is_validated", False))
+        
+        return {
+            **state,
+            "human_feedback": "validated" if is_validated else "rejected",
+            "is_validated": is_validated,
+            "feedback_notes": feedback.get("feedback_notes", "")
+        }
 
 # Helper function to facilitate integration with the graph
 def get_human_feedback(state: State) -> State:
     node = HumanFeedbackNode()
-    return node.execute(state)
\ No newline at end of file
+    return node.execute(state)
@@ -3,31 +3,72 @@ Node responsible for regenerating responses based on feedback.
 """
 from graph.state import State
 from services.llm_service import LLMService
+from services.model_router import ModelRouter, REGENERATE
 
 class RegenerateResponseNode:
-    def __init__(self):
-        self.llm_service = LLMService()
+    def __init__(self, llm_service=None, speculation_service=None):
+        self.llm_service = llm_service or LLMService()
+        self.model_router = ModelRouter()
+        self.speculation_service = speculation_service
     
-    def execute(self, state: State) -> State:
+    def regenerate(self, state: State, feedback):
         """
-        Regenerates a response based on user feedback.
+        Generates a new response for feedback on the response in the state.
+        Returns the response and the model used.
         """
-        print("Regenerating based on feedback")
-        
         question = state["question"]
-        feedback = state["feedback_notes"]
         previous_responses = state.get("previous_responses", [])
+        feedback_history = state.get("feedback_history", []) + [feedback]
+        
+        # Adapted and identical answers are not tracked in previous_responses,
+        # but they are the response the feedback refers to
+        rejected_responses = previous_responses
+        current_response = state.get("llm_response", "")
+        if current_response and (not previous_responses or previous_responses[-1] != current_response):
+            rejected_responses = previous_responses + [current_response]
+        
+        model = self.model_router.select_model(
+            REGENERATE,
+            feedback=feedback,
+            previous_model=state.get("llm_model", "")
+        )
+        print(f"Using model: {model}")
         
         new_response = self.llm_service.regenerate_with_feedback(
             question, 
             feedback, 
-            previous_responses
+            rejected_responses,
+            feedback_history,
+            model=model
         )
+        return new_response, model
+    
+    def execute(self, state: State) -> State:
+        """
+        Regenerates a response based on user feedback, using the variant
+        prepared during the review when it matches the feedback.
+        """
+        print("Regenerating based on feedback")
+        
+        feedback = state["feedback_notes"]
+        previous_responses = state.get("previous_responses", [])
+        
+        speculative = None
+        if self.speculation_service:
+            speculative = self.speculation_service.take(state, feedback)
+        
+        if speculative:
+            print("Using the response prepared during the review")
+            new_response, model = speculative
+        else:
+            new_response, model = self.regenerate(state, feedback)
         
         return {
             **state,
             "llm_response": new_response,
+            "llm_model": model,
             "previous_responses": previous_responses + [new_response],
+            "feedback_history": state.get("feedback_history", []) + [feedback],
             "from_database": False
         }
 
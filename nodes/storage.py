@@ -3,10 +3,11 @@ Node responsible for storing validated responses in the database.
 """
 from graph.state import State
 from services.vector_db import VectorDBService
+from config import DEFAULT_NAMESPACE
 
 class StoreValidatedResponseNode:
-    def __init__(self):
-        self.vector_db_service = VectorDBService()
+    def __init__(self, vector_db_service=None):
+        self.vector_db_service = vector_db_service or VectorDBService()
     
     def execute(self, state: State) -> State:
         """
@@ -19,13 +20,24 @@ class StoreValidatedResponseNode:
         feedback_notes = state.get("feedback_notes", "")
         from_database = state.get("from_database", False)
         original_question = state.get("original_question", "")
+        namespace = state.get("namespace") or DEFAULT_NAMESPACE
+        
+        # A stored answer served unchanged only gets the question as a new alias.
+        # Otherwise the new answer is linked to the answer it was adapted or regenerated from
+        answer_id = None
+        source_answer_id = state.get("answer_id") or None
+        if from_database and (state.get("is_identical", False) or state.get("is_near_duplicate", False)):
+            answer_id, source_answer_id = source_answer_id, None
         
         self.vector_db_service.add_validated_response(
             question=question,
             response=validated_response,
             feedback_notes=feedback_notes,
             original_question=original_question,
-            from_database=from_database
+            from_database=from_database,
+            namespace=namespace,
+            answer_id=answer_id,
+            source_answer_id=source_answer_id
         )
         
         return state
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Script to list and assign threads waiting for human review.
+"""
+import argparse
+from datetime import datetime
+from config import REVIEW_LEASE_SECONDS, REVIEW_MAX_AGE_SECONDS, REVIEW_PAGE_SIZE
+from services.review_queue import ReviewQueue
+
+def format_thread(thread):
+    """Formats a pending thread for display."""
+    updated_at = datetime.fromtimestamp(thread["updated_at"]).strftime("%Y-%m-%d %H:%M:%S")
+    claim = ""
+    if thread["claimed_by"]:
+        lease = datetime.fromtimestamp(thread["lease_expires_at"]).strftime("%H:%M:%S")
+        claim = f" [claimed by {thread['claimed_by']} until {lease}]"
+    preview = thread["response_preview"].replace("\n", " ")
+    return (f"{thread['thread_id']} (attempt {thread['attempt_count']}, updated {updated_at}){claim}\n"
+            f"  Q: {thread['question']}\n"
+            f"  A: {preview}")
+
+def parse_cursor(value):
+    """Parses a cursor printed by the list command ('<created_at>:<thread_id>')."""
+    created_at, thread_id = value.split(":", 1)
+    return float(created_at), thread_id
+
+def main():
+    parser = argparse.ArgumentParser(description="Lists and assigns threads waiting for human review.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="Lists pending threads, oldest first")
+    list_parser.add_argument("--page-size", type=int, default=REVIEW_PAGE_SIZE)
+    list_parser.add_argument("--cursor", type=parse_cursor, help="Cursor printed with the previous page")
+    list_parser.add_argument("--unclaimed", action="store_true", help="Only threads without an active lease")
+
+    claim_parser = subparsers.add_parser("claim", help="Claims a thread (the oldest available by default)")
+    claim_parser.add_argument("--reviewer", required=True)
+    claim_parser.add_argument("--thread", help="Thread id to claim")
+    claim_parser.add_argument("--lease", type=int, default=REVIEW_LEASE_SECONDS, help="Lease in seconds")
+
+    release_parser = subparsers.add_parser("release", help="Releases a claimed thread")
+    release_parser.add_argument("--reviewer", required=True)
+    release_parser.add_argument("--thread", required=True)
+
+    cleanup_parser = subparsers.add_parser("cleanup", help="Removes abandoned threads (also done before listing)")
+    cleanup_parser.add_argument("--max-age", type=int, default=REVIEW_MAX_AGE_SECONDS,
+                                help=f"Age in seconds of the unclaimed threads removed (default: {REVIEW_MAX_AGE_SECONDS})")
+
+    args = parser.parse_args()
+    queue = ReviewQueue()
+
+    if args.command == "list":
+        queue.remove_stale()
+        threads, next_cursor = queue.list_pending(args.page_size, args.cursor, args.unclaimed)
+        if not threads:
+            print("No threads waiting for review.")
+        for thread in threads:
+            print(format_thread(thread))
+        if next_cursor:
+            print(f"\nNext page: --cursor {next_cursor[0]}:{next_cursor[1]}")
+
+    elif args.command == "claim":
+        if args.thread:
+            thread = queue.get(args.thread) if queue.claim(args.thread, args.reviewer, args.lease) else None
+        else:
+            thread = queue.claim_next(args.reviewer, args.lease)
+        if thread:
+            print(format_thread(thread))
+        else:
+            print("No thread available to claim.")
+
+    elif args.command == "release":
+        if queue.release(args.thread, args.reviewer):
+            print(f"Thread {args.thread} released.")
+        else:
+            print(f"Thread {args.thread} is not claimed by {args.reviewer}.")
+
+    elif args.command == "cleanup":
+        print(f"{queue.remove_stale(args.max_age)} abandoned threads removed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Script to re-embed the vector database after changing EMBEDDING_MODEL.
+Validated answers stay searchable while it runs, and an interrupted run
+resumes where it stopped when started again.
+"""
+import argparse
+from config import DEFAULT_NAMESPACE, EMBEDDING_MODEL, REEMBED_BATCH_SIZE
+from services.embedding_migration import EmbeddingMigrationService
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embeds validated answers with a new embedding model.")
+    parser.add_argument("--namespace", action="append",
+                        help=f"Namespace to migrate, can be repeated (default: {DEFAULT_NAMESPACE})")
+    parser.add_argument("--model", default=EMBEDDING_MODEL,
+                        help=f"Target embedding model (default: {EMBEDDING_MODEL})")
+    parser.add_argument("--batch-size", type=int, default=REEMBED_BATCH_SIZE,
+                        help=f"Documents per batch (default: {REEMBED_BATCH_SIZE})")
+    args = parser.parse_args()
+
+    for namespace in args.namespace or [DEFAULT_NAMESPACE]:
+        print(f"\nMigrating namespace '{namespace}' to '{args.model}'...")
+        EmbeddingMigrationService(namespace).migrate(args.model, args.batch_size)
+
+if __name__ == "__main__":
+    main()
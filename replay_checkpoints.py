@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Script to replay recorded question threads through the graph offline.
+LLM and vector database outputs are served from the recorded checkpoints,
+so runs are deterministic and can be compared before and after a change.
+"""
+import argparse
+import json
+from config import SQLITE_DB_PATH, CHECKPOINT_DURABILITY
+from services.replay import ReplayHarness, extract_sessions, compare_reports
+
+def print_report(report):
+    """Prints a summary of a replay report."""
+    print("\n" + "=" * 60)
+    print(f"Replayed sessions: {report['sessions']} ({report['total_duration']:.3f}s, "
+          f"{report['durability']} durability)")
+    print("=" * 60)
+    for node_name, stats in report["nodes"].items():
+        print(f"{node_name:<25} calls={stats['calls']:<4} mean={stats['mean'] * 1000:.2f}ms "
+              f"p50={stats['p50'] * 1000:.2f}ms p95={stats['p95'] * 1000:.2f}ms")
+    for node_name, stats in report.get("interrupted_nodes", {}).items():
+        print(f"{node_name:<25} interrupted={stats['calls']:<4} total={stats['total'] * 1000:.2f}ms")
+    volume = report["checkpoint_volume"]
+    print(f"\nCheckpoints: {volume['checkpoints']} - Writes: {volume['writes']} - Bytes: {volume['bytes']}")
+    if report["routing_mismatches"]:
+        print(f"Routing differs from the recording in: {', '.join(report['routing_mismatches'])}")
+    else:
+        print("Routing matches the recording in every session.")
+
+def print_comparison(comparison):
+    """Prints the relative change against a baseline report."""
+    def percent(value):
+        return "n/a" if value is None else f"{value * 100:+.1f}%"
+
+    print("\nCompared to baseline:")
+    print(f"Total duration: {percent(comparison['total_duration'])}")
+    for key, value in comparison["checkpoint_volume"].items():
+        print(f"Checkpoint {key}: {percent(value)}")
+    for node_name, metrics in comparison["nodes"].items():
+        print(f"{node_name:<25} " + " ".join(f"{metric}={percent(value)}" for metric, value in metrics.items()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays recorded checkpoint threads through the graph.")
+    parser.add_argument("--db", default=SQLITE_DB_PATH, help=f"Recorded checkpoint database (default: {SQLITE_DB_PATH})")
+    parser.add_argument("--thread", action="append", help="Thread id to replay, can be repeated (default: all)")
+    parser.add_argument("--limit", type=int, help="Maximum number of sessions to replay")
+    parser.add_argument("--output", help="Writes the JSON report to this file")
+    parser.add_argument("--durability", choices=["sync", "interrupt"], default=CHECKPOINT_DURABILITY,
+                        help=f"Checkpoint durability of the replayed graph (default: {CHECKPOINT_DURABILITY})")
+    parser.add_argument("--baseline", help="JSON report of a previous run to compare against")
+    args = parser.parse_args()
+
+    sessions = extract_sessions(args.db, thread_ids=args.thread, limit=args.limit)
+    if not sessions:
+        print("No recorded sessions found.")
+        return
+
+    deferred = [session["thread_id"] for session in sessions if session["durability"] == "interrupt"]
+    if deferred:
+        print("!" * 60)
+        print(f"WARNING: {len(deferred)} of {len(sessions)} sessions were recorded with deferred")
+        print("(CHECKPOINT_DURABILITY=interrupt) checkpoints. They are rebuilt from the")
+        print("checkpoint where each run stopped: the intermediate steps of each run were")
+        print("not recorded, so their replay is less precise. Record with")
+        print("CHECKPOINT_DURABILITY=sync to replay every step.")
+        print("!" * 60)
+
+    report = ReplayHarness(durability=args.durability).run(sessions)
+    print_report(report)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            print_comparison(compare_reports(json.load(baseline_file), report))
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nReport saved as '{args.output}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+"""
+Read-optimized snapshot of a namespace's validated answers.
+
+The index of a namespace is a directory of append-only segments listed in
+MANIFEST.json. Each segment has:
+- vectors.npy: the embeddings quantized to int8 (one scale per row) or float16
+- scales.npy and norms.npy: the row scales and squared norms (float32)
+- ids.npy: the document ids of the rows, and sorted_ids.npy / sorted_rows.npy
+  the same ids sorted with their rows, to look documents up by id
+- records.bin and offsets.npy: the document and metadata of each row as JSON,
+  starting at the byte offsets in offsets.npy
+
+Every file is memory-mapped, so every process shares the same pages, and ids
+and records are only decoded for the search results. Builds append a
+segment with the documents added since the last build and merge the segments
+when there are too many. The manifest is replaced atomically, so readers never
+see a partial index.
+"""
+import bisect
+import fcntl
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import numpy as np
+from langchain_core.documents import Document
+from config import (
+    ANSWER_INDEX_DIR,
+    ANSWER_INDEX_DTYPE,
+    ANSWER_INDEX_BATCH_SIZE,
+    ANSWER_INDEX_SEARCH_CHUNK,
+    ANSWER_INDEX_MAX_SEGMENTS,
+    ANSWER_INDEX_SEGMENT_GRACE_SECONDS
+)
+
+FORMAT_VERSION = 3
+
+def quantize(vectors, dtype):
+    """
+    Quantizes float32 vectors. int8 uses a symmetric scale per row.
+    Returns the quantized vectors, the row scales and the squared norms of
+    the dequantized vectors (used to compute L2 distances).
+    """
+    if dtype == "float16":
+        quantized = vectors.astype(np.float16)
+        scales = np.ones(len(vectors), dtype=np.float32)
+    elif dtype == "int8":
+        scales = (np.abs(vectors).max(axis=1) / 127).astype(np.float32)
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    else:
+        raise ValueError(f"Unsupported answer index dtype: {dtype}")
+
+    dequantized = quantized.astype(np.float32) * scales[:, None]
+    norms = np.einsum("ij,ij->i", dequantized, dequantized).astype(np.float32)
+    return quantized, scales, norms
+
+def encode_record(document, metadata):
+    return json.dumps({"document": document, "metadata": metadata or {}}).encode()
+
+def write_segment(path, ids, vectors, scales, norms, records):
+    """Writes a segment directory. records are the encoded rows (see encode_record)."""
+    os.makedirs(path)
+    np.save(os.path.join(path, "vectors.npy"), vectors)
+    np.save(os.path.join(path, "scales.npy"), scales)
+    np.save(os.path.join(path, "norms.npy"), norms)
+    encoded_ids = np.array([doc_id.encode() for doc_id in ids], dtype=np.bytes_)
+    order = np.argsort(encoded_ids, kind="stable")
+    np.save(os.path.join(path, "ids.npy"), encoded_ids)
+    np.save(os.path.join(path, "sorted_ids.npy"), encoded_ids[order])
+    np.save(os.path.join(path, "sorted_rows.npy"), order.astype(np.int64))
+
+    offsets = [0]
+    with open(os.path.join(path, "records.bin"), "wb") as records_file:
+        for record in records:
+            records_file.write(record)
+            offsets.append(offsets[-1] + len(record))
+    np.save(os.path.join(path, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+class AnswerIndexSegment:
+    """A segment opened for search."""
+    def __init__(self, path):
+        self.path = path
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.sorted_ids = np.load(os.path.join(path, "sorted_ids.npy"), mmap_mode="r")
+        self.sorted_rows = np.load(os.path.join(path, "sorted_rows.npy"), mmap_mode="r")
+        with open(os.path.join(path, "records.bin"), "rb") as records_file:
+            self.records = mmap.mmap(records_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def doc_id(self, row):
+        return self.ids[row].decode()
+
+    def find(self, doc_id):
+        """Returns the row of a document id (binary search), or None."""
+        key = doc_id.encode()
+        position = int(np.searchsorted(self.sorted_ids, key))
+        if position < len(self.sorted_ids) and self.sorted_ids[position] == key:
+            return int(self.sorted_rows[position])
+        return None
+
+    def raw_record(self, row):
+        return self.records[int(self.offsets[row]):int(self.offsets[row + 1])]
+
+    def record(self, row):
+        """Returns the (document, metadata) of a row."""
+        record = json.loads(self.raw_record(row))
+        return record["document"], record["metadata"]
+
+    def distances(self, query, query_norm):
+        """Returns the squared L2 distance of every row to the query, scanning in chunks."""
+        distances = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), ANSWER_INDEX_SEARCH_CHUNK):
+            end = start + ANSWER_INDEX_SEARCH_CHUNK
+            dot = (self.vectors[start:end].astype(np.float32) @ query) * self.scales[start:end]
+            distances[start:end] = query_norm + self.norms[start:end] - 2 * dot
+        return distances
+
+class AnswerIndexSnapshot:
+    """
+    The segments listed in a manifest, opened for search. A document appended
+    again supersedes its rows in older segments. Ids are looked up in the
+    mapped files when needed, so opening a snapshot doesn't read them.
+    """
+    def __init__(self, manifest, segments):
+        self.collection_name = manifest["collection_name"]
+        self.embedding_model = manifest["embedding_model"]
+        self.dtype = manifest["dtype"]
+        self.segments = segments
+        self.deleted_ids = set(manifest["deleted_ids"])
+        self.starts = []
+        total = 0
+        for segment in segments:
+            self.starts.append(total)
+            total += len(segment)
+        self.size = total
+
+    def locate(self, doc_id):
+        """Returns the (segment, row) holding the current version of a document, or None."""
+        if doc_id in self.deleted_ids:
+            return None
+        for segment in reversed(self.segments):
+            row = segment.find(doc_id)
+            if row is not None:
+                return segment, row
+        return None
+
+    def _is_live(self, segment_index, row):
+        doc_id = self.segments[segment_index].doc_id(row)
+        if doc_id in self.deleted_ids:
+            return False
+        return all(segment.find(doc_id) is None for segment in self.segments[segment_index + 1:])
+
+    def live_ids(self):
+        """Yields the id of every live document (used by builds)."""
+        for segment_index, segment in enumerate(self.segments):
+            for row in range(len(segment)):
+                if self._is_live(segment_index, row):
+                    yield segment.doc_id(row)
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        """
+        Returns the k closest documents with their squared L2 distance (the
+        same score as Chroma's default space).
+        """
+        if not self.segments:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = float(query @ query)
+        distances = np.concatenate([segment.distances(query, query_norm) for segment in self.segments])
+
+        # Only the closest rows are sorted; more are taken when the filter or
+        # superseded rows leave fewer than k results
+        limit = min(self.size, max(k * 4, 32))
+        while True:
+            if limit < self.size:
+                candidates = np.argpartition(distances, limit - 1)[:limit]
+            else:
+                candidates = np.arange(self.size)
+            candidates = candidates[np.argsort(distances[candidates])]
+
+            results = []
+            for index in candidates:
+                segment_index = bisect.bisect_right(self.starts, index) - 1
+                segment = self.segments[segment_index]
+                row = int(index) - self.starts[segment_index]
+                if not self._is_live(segment_index, row):
+                    continue
+                document, metadata = segment.record(row)
+                if all(metadata.get(key) == value for key, value in (filter or {}).items()):
+                    results.append((
+                        Document(page_content=document, metadata=metadata, id=segment.doc_id(row)),
+                        max(float(distances[index]), 0.0)
+                    ))
+                    if len(results) == k:
+                        return results
+            if limit == self.size:
+                return results
+            limit = min(self.size, limit * 4)
+
+    def get(self, ids=None, include=None):
+        """Returns documents by id, in the format of Chroma's get (used to resolve aliases)."""
+        found = {"ids": [], "documents": [], "metadatas": []}
+        for doc_id in ids if ids is not None else self.live_ids():
+            location = self.locate(doc_id)
+            if location is None:
+                continue
+            segment, row = location
+            document, metadata = segment.record(row)
+            found["ids"].append(doc_id)
+            found["documents"].append(document)
+            found["metadatas"].append(metadata)
+        return found
+
+class AnswerIndex:
+    """
+    Opens and builds the snapshots in ANSWER_INDEX_DIR. Use get_answer_index()
+    to share one per process, so its snapshots stay cached across requests.
+    """
+    def __init__(self, index_dir=ANSWER_INDEX_DIR):
+        self.index_dir = index_dir
+        # index name -> (manifest file identity, snapshot), reopened when the manifest is replaced
+        self.snapshots = {}
+        # segment path -> opened segment, shared by the snapshots of an index
+        self.segments = {}
+        self.lock = threading.Lock()
+
+    def _index_path(self, index_name, *parts):
+        """Path inside the directory of an index (named after the namespace's collection slug)."""
+        if not re.fullmatch(r"[a-zA-Z0-9][a-zA-Z0-9._-]*", index_name):
+            raise ValueError(f"Invalid answer index name: '{index_name}'")
+        return os.path.join(self.index_dir, index_name, *parts)
+
+    def _read_manifest(self, index_name):
+        try:
+            with open(self._index_path(index_name, "MANIFEST.json")) as manifest_file:
+                return json.load(manifest_file)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, index_name, manifest):
+        manifest_tmp = self._index_path(index_name, f"MANIFEST.json.{uuid.uuid4().hex}")
+        with open(manifest_tmp, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(manifest_tmp, self._index_path(index_name, "MANIFEST.json"))
+
+    def _open_snapshot(self, index_name, manifest):
+        segments = []
+        for segment in manifest["segments"]:
+            path = self._index_path(index_name, segment["name"])
+            if path not in self.segments:
+                self.segments[path] = AnswerIndexSegment(path)
+            segments.append(self.segments[path])
+        return AnswerIndexSnapshot(manifest, segments)
+
+    def open(self, index_name, collection_name, embedding_model):
+        """
+        Returns the current snapshot of an index, or None when there is none
+        or it was built from another collection or embedding model.
+        """
+        try:
+            stat = os.stat(self._index_path(index_name, "MANIFEST.json"))
+        except FileNotFoundError:
+            return None
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            cached = self.snapshots.get(index_name)
+            if cached and cached[0] == identity:
+                snapshot = cached[1]
+            else:
+                snapshot = self._open_snapshot(index_name, self._read_manifest(index_name))
+                self.snapshots[index_name] = (identity, snapshot)
+                # Segments merged away are unmapped once no snapshot uses them
+                in_use = {segment.path for _, cached_snapshot in self.snapshots.values() for segment in cached_snapshot.segments}
+                self.segments = {path: segment for path, segment in self.segments.items() if path in in_use}
+
+        if (snapshot.collection_name, snapshot.embedding_model) != (collection_name, embedding_model):
+            return None
+        return snapshot
+
+    def build(self, index_name, db, collection_name, embedding_model, dtype=ANSWER_INDEX_DTYPE,
+              full=False, compact=False):
+        """
+        Brings an index up to date with the primary (Chroma) collection. Meant
+        to run outside the request path (build_answer_index.py).
+
+        Documents added since the last build are fetched with their embeddings
+        and appended as a new segment, and removed ones are recorded as deleted.
+        The segments are merged when there are more than ANSWER_INDEX_MAX_SEGMENTS,
+        when a quarter of the rows are deleted, or when compact is set. The
+        index is rebuilt from scratch when full is set or it was built from
+        another collection, model or dtype.
+
+        Returns:
+            The number of documents in the index
+        """
+        os.makedirs(self._index_path(index_name), exist_ok=True)
+
+        # Builds of the same index (e.g. from several processes) run one at a time
+        with open(self._index_path(index_name, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            manifest = self._read_manifest(index_name)
+            source = (collection_name, embedding_model, dtype)
+            if full or manifest is None or manifest.get("format") != FORMAT_VERSION or \
+                    (manifest["collection_name"], manifest["embedding_model"], manifest["dtype"]) != source:
+                manifest = {
+                    "format": FORMAT_VERSION,
+                    "collection_name": collection_name,
+                    "embedding_model": embedding_model,
+                    "dtype": dtype,
+                    "segments": [],
+                    "deleted_ids": []
+                }
+            indexed = AnswerIndexSnapshot(manifest, [
+                AnswerIndexSegment(self._index_path(index_name, segment["name"])) for segment in manifest["segments"]
+            ])
+
+            indexed_ids = set(indexed.live_ids())
+            ids = db.get(include=[])["ids"]
+            current_ids = set(ids)
+            new_ids = [doc_id for doc_id in ids if doc_id not in indexed_ids]
+            removed_ids = [doc_id for doc_id in indexed_ids if doc_id not in current_ids]
+            if not new_ids and not removed_ids and not compact and manifest["segments"]:
+                return len(indexed_ids)
+
+            if new_ids:
+                segment = self._append_segment(index_name, db, new_ids, dtype)
+                if segment:
+                    manifest["segments"].append(segment)
+            manifest["deleted_ids"] = sorted((set(manifest["deleted_ids"]) | set(removed_ids)) - set(new_ids))
+            manifest["built_at"] = time.time()
+
+            total_rows = sum(segment["count"] for segment in manifest["segments"])
+            if compact or len(manifest["segments"]) > ANSWER_INDEX_MAX_SEGMENTS or \
+                    len(manifest["deleted_ids"]) * 4 > total_rows:
+                manifest = self._compact(index_name, manifest)
+
+            self._write_manifest(index_name, manifest)
+            self._remove_unused_segments(index_name, manifest)
+            return len(indexed_ids) - len(removed_ids) + len(new_ids)
+
+    def _new_segment_name(self):
+        return f"seg-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    def _append_segment(self, index_name, db, new_ids, dtype):
+        """Writes the documents of new_ids to a new segment and returns its manifest entry."""
+        ids, records, vectors, scales, norms = [], [], [], [], []
+        for start in range(0, len(new_ids), ANSWER_INDEX_BATCH_SIZE):
+            batch = db.get(
+                ids=new_ids[start:start + ANSWER_INDEX_BATCH_SIZE],
+                include=["embeddings", "documents", "metadatas"]
+            )
+            if not batch["ids"]:
+                continue
+            batch_vectors, batch_scales, batch_norms = quantize(np.asarray(batch["embeddings"], dtype=np.float32), dtype)
+            # get() doesn't keep the order of the requested ids
+            ids += batch["ids"]
+            records += [encode_record(document, metadata) for document, metadata in zip(batch["documents"], batch["metadatas"])]
+            vectors.append(batch_vectors)
+            scales.append(batch_scales)
+            norms.append(batch_norms)
+        if not ids:
+            return None
+
+        name = self._new_segment_name()
+        write_segment(
+            self._index_path(index_name, name), ids,
+            np.concatenate(vectors), np.concatenate(scales), np.concatenate(norms), records
+        )
+        return {"name": name, "count": len(ids)}
+
+    def _compact(self, index_name, manifest):
+        """Merges the live rows of every segment into one, without fetching them again."""
+        snapshot = AnswerIndexSnapshot(manifest, [
+            AnswerIndexSegment(self._index_path(index_name, segment["name"])) for segment in manifest["segments"]
+        ])
+        compacted = {**manifest, "segments": [], "deleted_ids": []}
+
+        ids, records, vectors, scales, norms = [], [], [], [], []
+        for segment_index, segment in enumerate(snapshot.segments):
+            rows = [row for row in range(len(segment)) if snapshot._is_live(segment_index, row)]
+            if not rows:
+                continue
+            ids += [segment.doc_id(row) for row in rows]
+            records += [segment.raw_record(row) for row in rows]
+            vectors.append(segment.vectors[rows])
+            scales.append(segment.scales[rows])
+            norms.append(segment.norms[rows])
+        if not ids:
+            return compacted
+
+        name = self._new_segment_name()
+        write_segment(
+            self._index_path(index_name, name), ids,
+            np.concatenate(vectors), np.concatenate(scales), np.concatenate(norms), records
+        )
+        compacted["segments"] = [{"name": name, "count": len(ids)}]
+        return compacted
+
+    def _remove_unused_segments(self, index_name, manifest):
+        """
+        Removes segments that are no longer in the manifest once they are old
+        enough for readers of the previous manifest to have opened them.
+        Processes that have them mapped keep reading them, since the files are only unlinked.
+        """
+        in_use = {segment["name"] for segment in manifest["segments"]}
+        index_path = self._index_path(index_name)
+        for name in os.listdir(index_path):
+            path = os.path.join(index_path, name)
+            if name.startswith("seg-") and name not in in_use and \
+                    time.time() - os.path.getmtime(path) > ANSWER_INDEX_SEGMENT_GRACE_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+def get_answer_index():
+    """Returns the AnswerIndex shared by every service of the process."""
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = AnswerIndex()
+        return _shared_index
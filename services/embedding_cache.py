@@ -0,0 +1,107 @@
+"""
+Cache of document embeddings computed ahead of time, shared by all processes.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from langchain_core.embeddings import Embeddings
+from config import SPECULATION_DB_PATH, SPECULATION_TTL_SECONDS
+
+def text_hash(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+class EmbeddingCache:
+    def __init__(self, db_path=SPECULATION_DB_PATH):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        # The connection is shared by the speculation threads and the graph's threads
+        self.lock = threading.Lock()
+        self._create_table()
+
+    def _create_table(self):
+        """Creates the cache table if it doesn't exist."""
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    text_hash TEXT NOT NULL,
+                    embedding_model TEXT NOT NULL,
+                    embedding TEXT NOT NULL,
+                    used INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (text_hash, embedding_model)
+                );
+                CREATE INDEX IF NOT EXISTS idx_embedding_cache_created ON embedding_cache (created_at);
+            """)
+
+    def get_many(self, embedding_model, texts, mark_used=True):
+        """Returns the cached embeddings of the texts ({text: embedding}), marking them as used."""
+        hashes = {text_hash(text): text for text in texts}
+        if not hashes:
+            return {}
+        placeholders = ", ".join("?" * len(hashes))
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                f"SELECT text_hash, embedding FROM embedding_cache "
+                f"WHERE embedding_model = ? AND created_at > ? AND text_hash IN ({placeholders})",
+                (embedding_model, time.time() - SPECULATION_TTL_SECONDS, *hashes)
+            ).fetchall()
+            if mark_used:
+                self.conn.executemany(
+                    "UPDATE embedding_cache SET used = 1 WHERE text_hash = ? AND embedding_model = ?",
+                    [(row[0], embedding_model) for row in rows]
+                )
+        return {hashes[row[0]]: json.loads(row[1]) for row in rows}
+
+    def put_many(self, embedding_model, texts, embeddings):
+        """Stores embeddings computed ahead of time and removes the expired ones."""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (text_hash, embedding_model, embedding, used, created_at) "
+                "VALUES (?, ?, ?, 0, ?)",
+                [(text_hash(text), embedding_model, json.dumps(embedding), now)
+                 for text, embedding in zip(texts, embeddings)]
+            )
+            self.conn.execute(
+                "DELETE FROM embedding_cache WHERE created_at <= ?",
+                (now - SPECULATION_TTL_SECONDS,)
+            )
+
+    def get_stats(self):
+        """Returns the number of prefetched embeddings and how many of them were used."""
+        with self.lock:
+            prefetched, used = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(used), 0) FROM embedding_cache"
+            ).fetchone()
+        return {"prefetched": prefetched, "used": used}
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embedding function that serves document embeddings from the cache when
+    they were prefetched (e.g. while a response waits for review), so storing
+    a validated answer doesn't wait for the embedding API.
+    """
+    def __init__(self, embeddings, embedding_model, cache):
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        cached = self.cache.get_many(self.embedding_model, texts)
+        missing = [text for text in texts if text not in cached]
+        if missing:
+            cached.update(zip(missing, self.embeddings.embed_documents(missing)))
+        return [cached[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def prefetch(self, texts):
+        """Computes and caches the embeddings of texts that aren't cached yet."""
+        texts = list(dict.fromkeys(text for text in texts if text))
+        cached = self.cache.get_many(self.embedding_model, texts, mark_used=False)
+        missing = [text for text in texts if text not in cached]
+        if missing:
+            self.cache.put_many(self.embedding_model, missing, self.embeddings.embed_documents(missing))
@@ -0,0 +1,71 @@
+"""
+Service for re-embedding a namespace's validated answers with a new embedding model.
+"""
+from config import DEFAULT_NAMESPACE, EMBEDDING_MODEL, REEMBED_BATCH_SIZE
+from services.vector_db import VectorDBService, shadow_collection_name
+
+class EmbeddingMigrationService:
+    def __init__(self, namespace=DEFAULT_NAMESPACE):
+        self.namespace = namespace
+        self.vector_db_service = VectorDBService(namespace=namespace)
+        self.registry = self.vector_db_service.registry
+
+    def migrate(self, target_model=EMBEDDING_MODEL, batch_size=REEMBED_BATCH_SIZE):
+        """
+        Re-embeds every document of the namespace into a shadow collection and
+        switches reads to it when done.
+
+        Reads keep using the current collection until the switch, and new
+        answers are written to both collections meanwhile. Progress is recorded
+        after each batch, so running it again after a crash resumes from the
+        last recorded batch. Documents keep their ids, so a batch written twice
+        is simply overwritten.
+
+        Returns:
+            The number of documents migrated, or 0 if nothing had to be done
+        """
+        source_collection, source_model = self.vector_db_service.get_active_collection(self.namespace)
+        if source_model == target_model:
+            print(f"Namespace '{self.namespace}' already uses '{target_model}'.")
+            return 0
+
+        source = self.vector_db_service.open_collection(source_collection, source_model)
+        migration = self.registry.start_migration(
+            self.namespace,
+            source_collection,
+            shadow_collection_name(source_collection, target_model),
+            target_model
+        )
+        target = self.vector_db_service.open_collection(migration["target_collection"], target_model)
+
+        offset = migration["next_offset"]
+        migrated_count = migration["migrated_count"]
+        if offset:
+            print(f"Resuming migration at document {offset}")
+
+        while True:
+            batch = source.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+            if not batch["ids"]:
+                break
+
+            metadatas = [
+                {**(metadata or {}), "embedding_model": target_model}
+                for metadata in batch["metadatas"]
+            ]
+            target.add_texts(texts=batch["documents"], metadatas=metadatas, ids=batch["ids"])
+
+            offset += len(batch["ids"])
+            migrated_count += len(batch["ids"])
+            self.registry.record_progress(self.namespace, offset, migrated_count)
+            print(f"Re-embedded {migrated_count} documents")
+
+        self.registry.complete_migration(self.namespace)
+        print(f"Namespace '{self.namespace}' now reads from '{migration['target_collection']}' ({target_model})")
+        # The snapshot of the previous collection no longer matches, so it is rebuilt
+        if self.vector_db_service.answer_index:
+            try:
+                self.vector_db_service.refresh_answer_index(self.namespace)
+            except Exception as e:
+                print(f"Warning: Error rebuilding the answer index: {e}")
+
+        return migrated_count
@@ -0,0 +1,132 @@
+"""
+Registry of the active collection and embedding model of each namespace.
+"""
+import sqlite3
+import threading
+import time
+from config import EMBEDDING_REGISTRY_PATH
+
+class EmbeddingRegistry:
+    def __init__(self, db_path=EMBEDDING_REGISTRY_PATH):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        # The registry is shared by the services and threads of a process (see get_registry)
+        self.lock = threading.RLock()
+        self._create_tables()
+
+    def _create_tables(self):
+        """Creates the registry tables if they don't exist."""
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS active_collections (
+                namespace TEXT PRIMARY KEY,
+                collection_name TEXT NOT NULL,
+                embedding_model TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS migrations (
+                namespace TEXT PRIMARY KEY,
+                source_collection TEXT NOT NULL,
+                target_collection TEXT NOT NULL,
+                target_model TEXT NOT NULL,
+                next_offset INTEGER NOT NULL DEFAULT 0,
+                migrated_count INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+
+    def find_active(self, namespace):
+        """Returns (collection_name, embedding_model) for a namespace, or None if it isn't registered."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT collection_name, embedding_model FROM active_collections WHERE namespace = ?",
+                (namespace,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def get_active(self, namespace, default_collection, default_model):
+        """
+        Returns (collection_name, embedding_model) for a namespace.
+        Namespaces seen for the first time are registered with the defaults.
+        """
+        active = self.find_active(namespace)
+        if active:
+            return active
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO active_collections VALUES (?, ?, ?, ?)",
+                (namespace, default_collection, default_model, time.time())
+            )
+        return self.find_active(namespace)
+
+    def get_migration(self, namespace):
+        """Returns the migration of a namespace as a dictionary, or None."""
+        with self.lock:
+            cursor = self.conn.execute("SELECT * FROM migrations WHERE namespace = ?", (namespace,))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([column[0] for column in cursor.description], row))
+
+    def get_running_migration(self, namespace):
+        """Returns the migration of a namespace if it is still running."""
+        migration = self.get_migration(namespace)
+        if migration and migration["status"] == "running":
+            return migration
+        return None
+
+    def start_migration(self, namespace, source_collection, target_collection, target_model):
+        """
+        Starts a migration, or returns the existing one when it targets the
+        same model so that an interrupted job resumes where it stopped.
+        """
+        migration = self.get_running_migration(namespace)
+        if migration and migration["target_model"] == target_model:
+            return migration
+
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO migrations VALUES (?, ?, ?, ?, 0, 0, 'running', ?, ?)",
+                (namespace, source_collection, target_collection, target_model, now, now)
+            )
+        return self.get_migration(namespace)
+
+    def record_progress(self, namespace, next_offset, migrated_count):
+        """Records the progress of a running migration after a batch is written."""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE migrations SET next_offset = ?, migrated_count = ?, updated_at = ? WHERE namespace = ?",
+                (next_offset, migrated_count, time.time(), namespace)
+            )
+
+    def complete_migration(self, namespace):
+        """Switches reads to the migrated collection in a single transaction."""
+        migration = self.get_running_migration(namespace)
+        if migration is None:
+            raise ValueError(f"No running migration for namespace '{namespace}'")
+
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO active_collections VALUES (?, ?, ?, ?)",
+                (namespace, migration["target_collection"], migration["target_model"], now)
+            )
+            self.conn.execute(
+                "UPDATE migrations SET status = 'completed', updated_at = ? WHERE namespace = ?",
+                (now, namespace)
+            )
+
+_shared_registries = {}
+_shared_registries_lock = threading.Lock()
+
+def get_registry(db_path=EMBEDDING_REGISTRY_PATH):
+    """
+    Returns the registry shared by every service of the process, so the
+    connection is opened and the tables created once instead of per service.
+    """
+    with _shared_registries_lock:
+        if db_path not in _shared_registries:
+            _shared_registries[db_path] = EmbeddingRegistry(db_path)
+        return _shared_registries[db_path]
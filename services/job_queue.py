@@ -0,0 +1,213 @@
+"""
+Service for the durable queue of graph runs executed by worker processes.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from langgraph.types import Command
+from config import (
+    JOB_QUEUE_DB_PATH,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_WAIT_TIMEOUT
+)
+
+# Job kinds: a new question (runs generate_llm_response) or the reviewer's
+# feedback on a thread waiting for review (runs regenerate_response or the storage)
+GENERATE = "generate"
+FEEDBACK = "feedback"
+
+class JobQueue:
+    def __init__(self, db_path=JOB_QUEUE_DB_PATH):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        # The connection is shared with the heartbeat thread of a running job
+        self.lock = threading.Lock()
+        self._create_table()
+
+    def _create_table(self):
+        """Creates the jobs table and its index if they don't exist."""
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    thread_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    expected_checkpoint_id TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    lease_expires_at REAL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+            """)
+
+    def _to_dict(self, cursor, row):
+        job = dict(zip([column[0] for column in cursor.description], row))
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def enqueue(self, thread_id, kind, payload, expected_checkpoint_id=None):
+        """
+        Adds a job for a thread.
+
+        Args:
+            thread_id: Graph thread the job runs on
+            kind: GENERATE (payload is the initial state) or FEEDBACK (payload is the resume value)
+            payload: JSON-serializable graph input
+            expected_checkpoint_id: Checkpoint the thread must still be at when the
+                job runs, so a job finished before a worker crash is not run twice
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (job_id, thread_id, kind, payload, expected_checkpoint_id, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, thread_id, kind, json.dumps(payload), expected_checkpoint_id, now, now)
+            )
+        return job_id
+
+    def get(self, job_id):
+        """Returns a job as a dictionary, or None."""
+        with self.lock:
+            cursor = self.conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+            row = cursor.fetchone()
+            return self._to_dict(cursor, row) if row else None
+
+    def claim(self, worker_id, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        """
+        Claims the oldest queued job, or a running job whose worker stopped
+        renewing its lease (e.g. the worker process died). Returns it, or None.
+        Expired jobs that already used max_attempts are marked as failed
+        instead, so a job that kills its worker is not retried forever.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            # The write lock keeps two workers from claiming the same job
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute("""
+                UPDATE jobs SET status = 'failed', worker_id = NULL, lease_expires_at = NULL, updated_at = ?,
+                    error = 'Lease expired after ' || attempts || ' attempts (the worker stopped while running it)'
+                WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?
+            """, (now, now, max_attempts))
+            row = self.conn.execute("""
+                SELECT job_id FROM jobs
+                WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?)
+                ORDER BY created_at LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("""
+                UPDATE jobs SET status = 'running', worker_id = ?, lease_expires_at = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE job_id = ?
+            """, (worker_id, now + lease_seconds, now, row[0]))
+        return self.get(row[0])
+
+    def renew(self, job_id, worker_id, lease_seconds=JOB_LEASE_SECONDS):
+        """Extends the lease of a running job. Returns False if the worker no longer holds it."""
+        with self.lock, self.conn:
+            cursor = self.conn.execute("""
+                UPDATE jobs SET lease_expires_at = ?, updated_at = ?
+                WHERE job_id = ? AND worker_id = ? AND status = 'running'
+            """, (time.time() + lease_seconds, time.time(), job_id, worker_id))
+        return cursor.rowcount == 1
+
+    @contextmanager
+    def heartbeat(self, job_id, worker_id, interval=JOB_HEARTBEAT_INTERVAL):
+        """Renews the lease of a job in a background thread while the block runs."""
+        stopped = threading.Event()
+
+        def renew_lease():
+            while not stopped.wait(interval):
+                if not self.renew(job_id, worker_id):
+                    print(f"Warning: Worker {worker_id} lost the lease of job {job_id}")
+                    return
+
+        thread = threading.Thread(target=renew_lease, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def complete(self, job_id, worker_id):
+        """Marks a job as done. Returns False if the worker no longer holds it."""
+        with self.lock, self.conn:
+            cursor = self.conn.execute("""
+                UPDATE jobs SET status = 'done', lease_expires_at = NULL, updated_at = ?
+                WHERE job_id = ? AND worker_id = ? AND status = 'running'
+            """, (time.time(), job_id, worker_id))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error, max_attempts=JOB_MAX_ATTEMPTS):
+        """
+        Queues a failed job again, or marks it as failed after max_attempts.
+        Returns False if the worker no longer holds it (another worker may be running it).
+        """
+        with self.lock, self.conn:
+            cursor = self.conn.execute("""
+                UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                    error = ?, worker_id = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE job_id = ? AND worker_id = ? AND status = 'running'
+            """, (max_attempts, error, time.time(), job_id, worker_id))
+        return cursor.rowcount == 1
+
+    def wait(self, job_id, timeout=None, poll_interval=JOB_POLL_INTERVAL):
+        """Waits until a job is done or failed and returns it."""
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            job = self.get(job_id)
+            if job["status"] in ("done", "failed"):
+                return job
+            if deadline and time.time() > deadline:
+                raise TimeoutError(f"Job {job_id} did not finish in {timeout} seconds")
+            time.sleep(poll_interval)
+
+class QueuedGraphRunner:
+    """
+    Runs the graph through the job queue instead of in the calling process,
+    with the same interface as GraphBuilder.run. Workers write the results
+    to the checkpoint database, where they are read with graph.get_state.
+    """
+    def __init__(self, graph, job_queue=None):
+        self.graph = graph
+        self.job_queue = job_queue or JobQueue()
+
+    def run(self, graph_input, thread, timeout=JOB_WAIT_TIMEOUT):
+        thread_id = thread["configurable"]["thread_id"]
+        if isinstance(graph_input, Command):
+            state = self.graph.get_state(thread)
+            job_id = self.job_queue.enqueue(
+                thread_id,
+                FEEDBACK,
+                graph_input.resume,
+                expected_checkpoint_id=state.config["configurable"]["checkpoint_id"]
+            )
+        else:
+            job_id = self.job_queue.enqueue(thread_id, GENERATE, graph_input)
+
+        try:
+            job = self.job_queue.wait(job_id, timeout=timeout)
+        except TimeoutError:
+            if self.job_queue.get(job_id)["status"] == "queued":
+                raise RuntimeError(
+                    f"No worker claimed job {job_id} in {timeout} seconds. "
+                    "Start the workers with 'python workers.py'."
+                )
+            raise RuntimeError(f"Job {job_id} did not finish in {timeout} seconds (JOB_WAIT_TIMEOUT).")
+        if job["status"] == "failed":
+            raise RuntimeError(f"Job {job_id} failed: {job['error']}")
+
+        return [self.graph.get_state(thread).values]
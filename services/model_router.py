@@ -0,0 +1,54 @@
+"""
+Service for choosing which model handles each LLM operation.
+"""
+from config import (
+    GENERATE_MODEL,
+    ADAPT_MODEL,
+    REGENERATE_MODEL,
+    FAST_LLM_MODEL,
+    MODEL_ROUTING_ENABLED,
+    SHORT_FEEDBACK_MAX_WORDS
+)
+
+GENERATE = "generate"
+ADAPT = "adapt"
+REGENERATE = "regenerate"
+
+class ModelRouter:
+    def __init__(self, routing_enabled=MODEL_ROUTING_ENABLED):
+        self.routing_enabled = routing_enabled
+        self.models = {
+            GENERATE: GENERATE_MODEL,
+            ADAPT: ADAPT_MODEL,
+            REGENERATE: REGENERATE_MODEL
+        }
+        self.fast_model = FAST_LLM_MODEL
+
+    def is_short_feedback(self, feedback):
+        """Checks if the feedback is a short instruction (e.g. "make it shorter")."""
+        return len((feedback or "").split()) <= SHORT_FEEDBACK_MAX_WORDS
+
+    def select_model(self, operation, feedback=None, previous_model=None):
+        """
+        Selects the model for an operation.
+
+        Without the routing policy, each operation uses its configured model.
+        With it:
+        - Adaptation uses the fast model
+        - Regeneration uses the fast model for short feedback, unless the
+          rejected answer already came from the fast model, in which case
+          it escalates to the regeneration model
+        - Fresh generation uses the generation model
+        """
+        if not self.routing_enabled:
+            return self.models[operation]
+
+        if operation == ADAPT:
+            return self.fast_model
+
+        if operation == REGENERATE:
+            if previous_model == self.fast_model or not self.is_short_feedback(feedback):
+                return self.models[REGENERATE]
+            return self.fast_model
+
+        return self.models[operation]
@@ -0,0 +1,190 @@
+"""
+Service for profiling graph runs on demand.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from langgraph.errors import GraphInterrupt
+from config import PROFILE_ENABLED, PROFILE_SAMPLE_RATE, PROFILER, PROFILE_DIR
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# Functions whose cumulative time is reported per phase: (path fragment, function name).
+# Times are inclusive, e.g. vector_search includes the embedding of the query.
+# Checkpoint writes run in background threads and are timed by instrument_checkpointer.
+PHASES = {
+    "graph_compile": [("langgraph/graph/state", "compile")],
+    "embeddings": [("langchain_openai/embeddings", "embed_query"), ("langchain_openai/embeddings", "embed_documents")],
+    "vector_search": [("langchain_chroma", "similarity_search_with_score")],
+    "llm": [("openai/resources/chat/completions", "create")]
+}
+
+# From Python 3.12, cProfile uses sys.monitoring: only one profiler can be active,
+# and the run's profile already covers the other threads, so their nodes are only timed
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+def should_profile(force=False):
+    """Decides if a run is profiled: always when enabled, otherwise for a sampled fraction."""
+    return force or PROFILE_ENABLED or random.random() < PROFILE_SAMPLE_RATE
+
+def paused(profiler):
+    """Pauses a profiler (if any) while waiting for user input."""
+    return profiler.paused() if profiler else nullcontext()
+
+class RunProfiler:
+    def __init__(self, run_name="run", output_dir=PROFILE_DIR, profiler=PROFILER):
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{run_name}-{uuid.uuid4().hex[:8]}"
+        self.output_dir = os.path.join(output_dir, self.run_id)
+        self.profiler_name = profiler if profiler != "pyinstrument" or pyinstrument else "cprofile"
+        self.node_timings = {}
+        self.interrupted_timings = {}
+        self.checkpoint_timings = []
+        self.thread_profiles = []
+        self.thread_id = threading.get_ident()
+        self.paused_time = 0.0
+
+    def wrap_node(self, node_name, function):
+        """
+        Records the time of every call of a graph node (GraphBuilder node_wrapper).
+        Calls stopped by the human feedback interrupt are recorded apart, since
+        the node runs again when resumed. Before Python 3.12, nodes executed
+        outside the profiled thread get their own cProfile, merged at the end.
+        """
+        def profiled_node(state):
+            thread_profile = None
+            if self.profiler_name == "cprofile" and PER_THREAD_PROFILES and threading.get_ident() != self.thread_id:
+                thread_profile = cProfile.Profile()
+                thread_profile.enable()
+            start = time.perf_counter()
+            timings = self.node_timings
+            try:
+                return function(state)
+            except GraphInterrupt:
+                timings = self.interrupted_timings
+                raise
+            finally:
+                timings.setdefault(node_name, []).append(time.perf_counter() - start)
+                if thread_profile:
+                    thread_profile.disable()
+                    self.thread_profiles.append(thread_profile)
+        return profiled_node
+
+    def instrument_checkpointer(self, checkpointer):
+        """Times the checkpoint writes (including serialization) of a checkpointer."""
+        for method_name in ["put", "put_writes"]:
+            method = getattr(checkpointer, method_name)
+
+            def timed_method(*args, _method=method, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return _method(*args, **kwargs)
+                finally:
+                    self.checkpoint_timings.append(time.perf_counter() - start)
+
+            setattr(checkpointer, method_name, timed_method)
+
+    @contextmanager
+    def paused(self):
+        """
+        Excludes a block (e.g. waiting for the reviewer) from the profile and duration.
+        The statistical profiler cannot be paused, so it only excludes it from the duration.
+        """
+        start = time.perf_counter()
+        if self.profiler_name == "cprofile":
+            self.profiler.disable()
+        try:
+            yield
+        finally:
+            if self.profiler_name == "cprofile":
+                self.profiler.enable()
+            self.paused_time += time.perf_counter() - start
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        if self.profiler_name == "pyinstrument":
+            self.profiler = pyinstrument.Profiler()
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.profiler_name == "pyinstrument":
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+        duration = time.perf_counter() - self.start - self.paused_time
+
+        try:
+            self._write_outputs(duration)
+        except Exception as e:
+            print(f"Warning: Error writing the profile: {e}")
+        return False
+
+    def _get_stats(self):
+        """Returns the cProfile stats of the run, including other threads."""
+        stats = pstats.Stats(self.profiler)
+        for thread_profile in self.thread_profiles:
+            stats.add(thread_profile)
+        return stats
+
+    def _get_phase_times(self, stats):
+        """Returns the cumulative time of each phase from the cProfile stats."""
+        stats = stats.stats
+        phase_times = {}
+        for phase, functions in PHASES.items():
+            phase_times[phase] = sum(
+                cumulative_time
+                for (filename, _, function_name), (_, _, _, cumulative_time, _) in stats.items()
+                if any(fragment in filename.replace(os.sep, "/") and function_name == name
+                       for fragment, name in functions)
+            )
+        return phase_times
+
+    def _write_outputs(self, duration):
+        """Writes the profile and the node-level breakdown to the run directory."""
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        breakdown = {
+            "run_id": self.run_id,
+            "profiler": self.profiler_name,
+            "duration": duration,
+            "nodes": {
+                node_name: {"calls": len(timings), "total": sum(timings)}
+                for node_name, timings in self.node_timings.items()
+            },
+            "interrupted_nodes": {
+                node_name: {"calls": len(timings), "total": sum(timings)}
+                for node_name, timings in self.interrupted_timings.items()
+            },
+            "checkpoint_writes": {
+                "calls": len(self.checkpoint_timings),
+                "total": sum(self.checkpoint_timings)
+            }
+        }
+
+        if self.profiler_name == "cprofile":
+            stats = self._get_stats()
+            stats.dump_stats(os.path.join(self.output_dir, "profile.prof"))
+            breakdown["phases"] = self._get_phase_times(stats)
+        else:
+            with open(os.path.join(self.output_dir, "profile.html"), "w") as html_file:
+                html_file.write(self.profiler.output_html())
+            with open(os.path.join(self.output_dir, "profile.txt"), "w") as text_file:
+                text_file.write(self.profiler.output_text())
+
+        with open(os.path.join(self.output_dir, "breakdown.json"), "w") as breakdown_file:
+            json.dump(breakdown, breakdown_file, indent=2)
+
+        print(f"Profile saved in '{self.output_dir}'")
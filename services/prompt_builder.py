@@ -0,0 +1,198 @@
+"""
+Service for building token-budgeted prompts.
+"""
+from config import (
+    LLM_MODEL,
+    PROMPT_TOKEN_BUDGET,
+    STORED_RESPONSE_TOKEN_BUDGET,
+    MAX_PREVIOUS_ATTEMPTS_IN_PROMPT
+)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+TRUNCATION_MARKER = "\n[...]\n"
+
+class PromptBuilder:
+    def __init__(self, model=LLM_MODEL, token_budget=PROMPT_TOKEN_BUDGET,
+                 stored_response_budget=STORED_RESPONSE_TOKEN_BUDGET,
+                 max_previous_attempts=MAX_PREVIOUS_ATTEMPTS_IN_PROMPT):
+        """
+        Args:
+            model: Default model the prompts are counted for. Prompts sent to
+                another model (e.g. the one chosen by the ModelRouter) pass it
+                to the methods, so they are counted with its tokenizer
+        """
+        self.model = model
+        self.token_budget = token_budget
+        self.stored_response_budget = stored_response_budget
+        self.max_previous_attempts = max_previous_attempts
+        # model -> tokenizer, loaded on first use
+        self.encodings = {}
+
+    def _load_encoding(self, model):
+        """Loads the tokenizer for the model, or None to fall back to an estimate."""
+        if tiktoken is None:
+            return None
+        try:
+            return tiktoken.encoding_for_model(model)
+        except Exception:
+            try:
+                return tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                return None
+
+    def _get_encoding(self, model=None):
+        model = model or self.model
+        if model not in self.encodings:
+            self.encodings[model] = self._load_encoding(model)
+        return self.encodings[model]
+
+    def count_tokens(self, text, model=None):
+        """Counts the tokens in a text (about 4 characters per token without tiktoken)."""
+        if not text:
+            return 0
+        encoding = self._get_encoding(model)
+        if encoding is None:
+            return (len(text) + 3) // 4
+        return len(encoding.encode(text))
+
+    def truncate(self, text, max_tokens, model=None):
+        """
+        Truncates a text to at most max_tokens, keeping its beginning and end
+        since answers usually open with the core content and close with a summary.
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.count_tokens(text, model) <= max_tokens:
+            return text
+
+        encoding = self._get_encoding(model)
+        marker_tokens = self.count_tokens(TRUNCATION_MARKER, model)
+        available = max(max_tokens - marker_tokens, 1)
+        head_tokens = (available * 3) // 4
+        tail_tokens = available - head_tokens
+
+        if encoding is None:
+            head = text[:head_tokens * 4]
+            tail = text[-tail_tokens * 4:] if tail_tokens else ""
+        else:
+            tokens = encoding.encode(text)
+            head = encoding.decode(tokens[:head_tokens])
+            tail = encoding.decode(tokens[-tail_tokens:]) if tail_tokens else ""
+
+        return f"{head}{TRUNCATION_MARKER}{tail}"
+
+    def _field_budget(self, template_tokens, model=None):
+        """
+        Returns the tokens each short field of a prompt (the question, the
+        feedback) may use: a quarter of what the template leaves, so the
+        longer parts keep at least half of the budget.
+        """
+        available = self.token_budget - template_tokens
+        if available < 4 * self.count_tokens(TRUNCATION_MARKER, model):
+            raise ValueError(
+                f"PROMPT_TOKEN_BUDGET ({self.token_budget}) is too small for the prompt template ({template_tokens} tokens)"
+            )
+        return available // 4
+
+    def build_adapt_prompt(self, question, stored_question, stored_response, model=None):
+        """
+        Builds the prompt to adapt a stored response to a new question, within
+        the token budget of the model it is sent to.
+        """
+        # Notes appended at storage time are not part of the answer itself
+        if "\n\nAdditional observations:" in stored_response:
+            stored_response = stored_response.split("\n\nAdditional observations:")[0]
+
+        template = """
+        I have a stored response for this question:
+        "{stored_question}"
+
+        The stored response is:
+        "{stored_response}"
+
+        Now I need to answer this new question:
+        "{question}"
+
+        Please adapt the stored response to answer the new question.
+        Keep the same format and level of detail, but modify the content
+        to match the specific requirements of the new question.
+        """
+
+        field_budget = self._field_budget(
+            self.count_tokens(template.format(stored_question="", stored_response="", question=""), model), model
+        )
+        question = self.truncate(question, field_budget, model)
+        stored_question = self.truncate(stored_question, field_budget, model)
+
+        fixed_tokens = self.count_tokens(
+            template.format(stored_question=stored_question, stored_response="", question=question), model
+        )
+        response_budget = min(self.stored_response_budget, self.token_budget - fixed_tokens)
+
+        return template.format(
+            stored_question=stored_question,
+            stored_response=self.truncate(stored_response, response_budget, model),
+            question=question
+        )
+
+    def build_regenerate_prompt(self, question, feedback, previous_responses=None, feedback_history=None, model=None):
+        """
+        Builds the prompt to regenerate a response based on feedback, within
+        the token budget of the model it is sent to.
+
+        The most recent attempts are the most relevant ones (the last one is the
+        response the current feedback refers to), so they are added newest first
+        until the token budget or max_previous_attempts is reached.
+        """
+        previous_responses = previous_responses or []
+        feedback_history = feedback_history or []
+
+        template = """
+        Question: {question}
+
+        USER FEEDBACK: "{feedback}"
+
+        Generate a new response that takes this feedback into account.
+        Be very specific in following EXACTLY what the feedback asks.
+        If the feedback mentions the response should be shorter, make it significantly shorter.
+        If the feedback mentions limiting to certain aspects, focus ONLY on those aspects.
+        """
+
+        field_budget = self._field_budget(self.count_tokens(template.format(question="", feedback=""), model), model)
+        instructions = template.format(
+            question=self.truncate(question, field_budget, model),
+            feedback=self.truncate(feedback, field_budget, model)
+        )
+
+        remaining = self.token_budget - self.count_tokens(instructions, model)
+
+        # Earlier feedback rounds are short and keep the model from repeating rejected choices
+        earlier_feedback = [note for note in feedback_history[:-1] if note]
+        feedback_section = ""
+        if earlier_feedback:
+            feedback_section = "\n        EARLIER FEEDBACK (already addressed, still applies):\n"
+            feedback_section += "".join(f'        - "{note}"\n' for note in earlier_feedback)
+            feedback_section = self.truncate(feedback_section, remaining // 4, model)
+            remaining -= self.count_tokens(feedback_section, model)
+
+        attempts = []
+        recent = list(reversed(previous_responses[-self.max_previous_attempts:]))
+        for index, response in enumerate(recent):
+            if remaining <= 0:
+                break
+            # Split what is left evenly among the attempts not yet added
+            share = remaining // (len(recent) - index)
+            label = "LAST REJECTED RESPONSE" if index == 0 else f"EARLIER REJECTED RESPONSE ({index})"
+            wrapper = f'\n        {label}:\n        ""\n'
+            truncated = self.truncate(response, share - self.count_tokens(wrapper, model), model)
+            if not truncated:
+                break
+            block = f'\n        {label}:\n        "{truncated}"\n'
+            remaining -= self.count_tokens(block, model)
+            attempts.append(block)
+
+        return instructions + feedback_section + "".join(attempts)
@@ -0,0 +1,357 @@
+"""
+Service for replaying recorded checkpoint threads through the graph offline.
+"""
+import sqlite3
+import statistics
+import time
+from langchain_core.documents import Document
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.errors import GraphInterrupt
+from langgraph.graph import END
+from langgraph.types import Command
+from config import SQLITE_DB_PATH, CHECKPOINT_DURABILITY, DEFAULT_NAMESPACE, SIMILARITY_THRESHOLD
+from graph.builder import GraphBuilder
+from utils.helpers import create_initial_state
+
+LLM_NODES = ["generate_llm_response", "regenerate_response"]
+
+# Nodes after which the flow is routed on the feedback
+# (evaluate_feedback in recordings made before the feedback was passed as the resume value)
+ROUTING_NODES = ["get_human_feedback", "evaluate_feedback"]
+
+def extract_sessions(db_path=SQLITE_DB_PATH, thread_ids=None, limit=None):
+    """
+    Extracts the recorded QA sessions from a checkpoint database.
+
+    Each session has the initial state, the recorded output of every node,
+    the human feedback updates in order, the executed node sequence and the
+    durability it was recorded with. Threads that never reached
+    generate_llm_response are skipped.
+
+    Threads recorded with CHECKPOINT_DURABILITY="interrupt" only keep the
+    checkpoint where each run stopped, so their sessions are rebuilt from
+    those checkpoints (see _extract_deferred_session).
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    saver = SqliteSaver(conn)
+
+    if thread_ids is None:
+        rows = conn.execute(
+            "SELECT thread_id, MIN(checkpoint_id) FROM checkpoints GROUP BY thread_id ORDER BY 2"
+        ).fetchall()
+        thread_ids = [row[0] for row in rows]
+
+    sessions = []
+    for thread_id in thread_ids:
+        # list() returns the newest checkpoint first
+        checkpoints = list(reversed(list(saver.list({"configurable": {"thread_id": thread_id}}))))
+        if not any((checkpoint.metadata or {}).get("source") == "input" for checkpoint in checkpoints):
+            session = _extract_deferred_session(thread_id, checkpoints)
+            if session:
+                sessions.append(session)
+                if limit and len(sessions) >= limit:
+                    break
+            continue
+
+        session = {
+            "thread_id": thread_id,
+            "durability": "sync",
+            "input": None,
+            "node_outputs": [],
+            "feedback_updates": [],
+            "node_sequence": []
+        }
+
+        for checkpoint in checkpoints:
+            metadata = checkpoint.metadata or {}
+            writes = metadata.get("writes") or {}
+            source = metadata.get("source")
+
+            if source == "input":
+                session["input"] = writes.get("__start__")
+            elif source == "update" and "get_human_feedback" in writes:
+                session["feedback_updates"].append(writes["get_human_feedback"])
+            elif source == "loop":
+                for node_name, output in writes.items():
+                    session["node_sequence"].append(node_name)
+                    session["node_outputs"].append((node_name, output or {}))
+                    if node_name == "get_human_feedback" and output:
+                        session["feedback_updates"].append(output)
+
+        if not isinstance(session["input"], dict) or "question" not in session["input"]:
+            continue
+        if "generate_llm_response" not in session["node_sequence"]:
+            continue
+
+        sessions.append(session)
+        if limit and len(sessions) >= limit:
+            break
+
+    conn.close()
+    return sessions
+
+def _extract_deferred_session(thread_id, checkpoints):
+    """
+    Rebuilds a session recorded with deferred durability, where each run
+    only persisted the checkpoint it stopped at (oldest first):
+    - the first one follows generate_llm_response, and its state has the question
+    - each following one is a resumed run: the feedback is read from its state,
+      and the node that ran after get_human_feedback from its writes
+    Returns None if the thread never reached generate_llm_response.
+    """
+    if not checkpoints:
+        return None
+    first_writes = (checkpoints[0].metadata or {}).get("writes") or {}
+    first_state = checkpoints[0].checkpoint.get("channel_values", {})
+    if "generate_llm_response" not in first_writes or "question" not in first_state:
+        return None
+
+    session = {
+        "thread_id": thread_id,
+        "durability": "interrupt",
+        "input": create_initial_state(
+            first_state["question"],
+            first_state.get("namespace") or DEFAULT_NAMESPACE,
+            first_state.get("search_namespaces") or None
+        ),
+        "node_outputs": [("generate_llm_response", first_writes["generate_llm_response"] or {})],
+        "feedback_updates": [],
+        "node_sequence": ["generate_llm_response"]
+    }
+
+    for checkpoint in checkpoints[1:]:
+        state = checkpoint.checkpoint.get("channel_values", {})
+        writes = (checkpoint.metadata or {}).get("writes") or {}
+        session["feedback_updates"].append({
+            "is_validated": bool(state.get("is_validated", False)),
+            "feedback_notes": state.get("feedback_notes", "")
+        })
+        session["node_sequence"].append("get_human_feedback")
+        for node_name, output in writes.items():
+            if node_name != "get_human_feedback":
+                session["node_sequence"].append(node_name)
+                session["node_outputs"].append((node_name, output or {}))
+
+    return session
+
+def get_routing_decisions(node_sequence):
+    """Returns the node chosen after each feedback evaluation (END if the flow stopped)."""
+    decisions = []
+    for index, node_name in enumerate(node_sequence):
+        if node_name in ROUTING_NODES:
+            following = node_sequence[index + 1:index + 2]
+            decisions.append(following[0] if following else END)
+    return decisions
+
+class ReplayLLMService:
+    """Stand-in for LLMService that serves the responses recorded for a session."""
+    def __init__(self):
+        self.load_session(None)
+
+    def load_session(self, session):
+        """Queues the LLM outputs recorded in a session."""
+        self.responses = []
+        self.calls = 0
+        if session is None:
+            return
+        for node_name, output in session["node_outputs"]:
+            if node_name == "generate_llm_response" and (output.get("is_identical") or output.get("is_near_duplicate")):
+                continue
+            if node_name in LLM_NODES and output.get("llm_response"):
+                self.responses.append(output["llm_response"])
+
+    def _next_response(self):
+        self.calls += 1
+        if not self.responses:
+            return ""
+        # Extra calls (e.g. a changed routing) reuse the last recorded response
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+    def generate_response(self, question, model=None):
+        return self._next_response()
+
+    def adapt_response(self, question, stored_question, stored_response, model=None):
+        return self._next_response()
+
+    def regenerate_with_feedback(self, question, feedback, previous_responses=None, feedback_history=None, model=None):
+        return self._next_response()
+
+class ReplayVectorDBService:
+    """Stand-in for VectorDBService that returns the search outcome recorded for a session."""
+    def __init__(self):
+        self.load_session(None)
+
+    def load_session(self, session):
+        """Loads the database match recorded in a session, if any."""
+        self.match = None
+        self.score = 0.0
+        self.saved = 0
+        if session is None:
+            return
+        for node_name, output in session["node_outputs"]:
+            if node_name == "generate_llm_response":
+                if output.get("from_database"):
+                    self.match = Document(
+                        page_content=output.get("llm_response", ""),
+                        metadata={"question": output.get("original_question", ""), "validated": True}
+                    )
+                    # Adapted matches are scored past the near-duplicate threshold, so they are adapted again
+                    reused = output.get("is_identical") or output.get("is_near_duplicate")
+                    self.score = 0.0 if reused else SIMILARITY_THRESHOLD
+                break
+
+    def search_similar_responses(self, question, k=None, similarity_threshold=None, namespaces=None):
+        return [(self.match, self.score)] if self.match else []
+
+    def add_validated_response(self, question, response, feedback_notes="", original_question="",
+                               from_database=False, namespace=None, answer_id=None, source_answer_id=None):
+        self.saved += 1
+        return True
+
+class ReplayHarness:
+    def __init__(self, replay_db_path=":memory:", durability=CHECKPOINT_DURABILITY):
+        self.replay_db_path = replay_db_path
+        self.durability = durability
+        self.llm_service = ReplayLLMService()
+        self.vector_db_service = ReplayVectorDBService()
+        self.node_timings = {}
+        self.interrupted_timings = {}
+        self.current_sequence = []
+
+    def _wrap_node(self, node_name, function):
+        """
+        Times every node call and records the executed node sequence. Calls
+        stopped by the human feedback interrupt are timed apart.
+        """
+        def timed_node(state):
+            start = time.perf_counter()
+            timings = self.node_timings
+            try:
+                result = function(state)
+            except GraphInterrupt:
+                timings = self.interrupted_timings
+                raise
+            finally:
+                timings.setdefault(node_name, []).append(time.perf_counter() - start)
+            # Interrupted calls raise, so only completed nodes are part of the sequence
+            self.current_sequence.append(node_name)
+            return result
+        return timed_node
+
+    def _build_graph(self):
+        self.builder = GraphBuilder(
+            db_path=self.replay_db_path,
+            llm_service=self.llm_service,
+            vector_db_service=self.vector_db_service,
+            node_wrapper=self._wrap_node,
+            visualize=False,
+            durability=self.durability,
+            speculate=False
+        )
+        return self.builder.build()
+
+    def _count_checkpoint_writes(self, thread_id):
+        """Returns the checkpoint rows and bytes written for a replayed thread."""
+        checkpoints, checkpoint_bytes = self.builder.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints WHERE thread_id = ?",
+            (thread_id,)
+        ).fetchone()
+        writes, write_bytes = self.builder.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM writes WHERE thread_id = ?",
+            (thread_id,)
+        ).fetchone()
+        return {
+            "checkpoints": checkpoints,
+            "writes": writes,
+            "bytes": checkpoint_bytes + write_bytes
+        }
+
+    def _replay_session(self, graph, session):
+        """Replays one session, feeding the recorded feedback at each interrupt."""
+        self.llm_service.load_session(session)
+        self.vector_db_service.load_session(session)
+        self.current_sequence = []
+
+        thread_id = f"replay-{session['thread_id']}"
+        thread = {"configurable": {"thread_id": thread_id}}
+
+        start = time.perf_counter()
+        self.builder.run(session["input"], thread)
+        for update in session["feedback_updates"]:
+            if not graph.get_state(thread).next:
+                break
+            self.builder.run(Command(resume=update), thread)
+        duration = time.perf_counter() - start
+
+        recorded_routing = get_routing_decisions(session["node_sequence"])
+        replayed_routing = get_routing_decisions(self.current_sequence)
+
+        return {
+            "thread_id": session["thread_id"],
+            "duration": duration,
+            "llm_calls": self.llm_service.calls,
+            "checkpoint_volume": self._count_checkpoint_writes(thread_id),
+            "recorded_routing": recorded_routing,
+            "replayed_routing": replayed_routing,
+            "routing_matches": recorded_routing == replayed_routing
+        }
+
+    def run(self, sessions):
+        """
+        Replays the sessions and returns a report with per-node timings,
+        checkpoint write volume and routing decisions.
+        """
+        graph = self._build_graph()
+        self.node_timings = {}
+        self.interrupted_timings = {}
+
+        threads = [self._replay_session(graph, session) for session in sessions]
+
+        node_stats = {}
+        for node_name, timings in self.node_timings.items():
+            ordered = sorted(timings)
+            node_stats[node_name] = {
+                "calls": len(timings),
+                "total": sum(timings),
+                "mean": statistics.mean(timings),
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+            }
+
+        return {
+            "durability": self.durability,
+            "sessions": len(threads),
+            "total_duration": sum(thread["duration"] for thread in threads),
+            "nodes": node_stats,
+            "interrupted_nodes": {
+                node_name: {"calls": len(timings), "total": sum(timings)}
+                for node_name, timings in self.interrupted_timings.items()
+            },
+            "checkpoint_volume": {
+                key: sum(thread["checkpoint_volume"][key] for thread in threads)
+                for key in ["checkpoints", "writes", "bytes"]
+            },
+            "routing_mismatches": [thread["thread_id"] for thread in threads if not thread["routing_matches"]],
+            "threads": threads
+        }
+
+def compare_reports(baseline, candidate):
+    """Returns the relative change of the main metrics between two replay reports."""
+    def change(before, after):
+        return (after - before) / before if before else None
+
+    comparison = {
+        "total_duration": change(baseline["total_duration"], candidate["total_duration"]),
+        "checkpoint_volume": {
+            key: change(baseline["checkpoint_volume"][key], candidate["checkpoint_volume"][key])
+            for key in candidate["checkpoint_volume"]
+        },
+        "nodes": {}
+    }
+    for node_name, stats in candidate["nodes"].items():
+        if node_name in baseline["nodes"]:
+            comparison["nodes"][node_name] = {
+                metric: change(baseline["nodes"][node_name][metric], stats[metric])
+                for metric in ["mean", "p50", "p95"]
+            }
+    return comparison
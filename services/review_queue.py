@@ -0,0 +1,172 @@
+"""
+Service for the queue of threads waiting for human review.
+"""
+import sqlite3
+import threading
+import time
+from config import SQLITE_DB_PATH, REVIEW_LEASE_SECONDS, REVIEW_MAX_AGE_SECONDS, REVIEW_PAGE_SIZE, REVIEW_PREVIEW_LENGTH
+
+class ReviewQueue:
+    def __init__(self, db_path=SQLITE_DB_PATH):
+        """
+        Args:
+            db_path: SQLite database of the queue (defaults to the checkpoint database).
+                The queue opens its own connection, so its transactions never
+                interleave with the checkpointer's.
+        """
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        # The connection is shared by the graph's threads
+        self.lock = threading.Lock()
+        self._create_table()
+
+    def _create_table(self):
+        """Creates the queue table and its indexes if they don't exist."""
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS pending_reviews (
+                    thread_id TEXT PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    attempt_count INTEGER NOT NULL,
+                    response_preview TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    claimed_by TEXT,
+                    lease_expires_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_pending_reviews_created
+                    ON pending_reviews (created_at, thread_id);
+                CREATE INDEX IF NOT EXISTS idx_pending_reviews_claimed_by
+                    ON pending_reviews (claimed_by, lease_expires_at);
+            """)
+
+    def _to_dict(self, cursor, row):
+        return dict(zip([column[0] for column in cursor.description], row))
+
+    def mark_pending(self, thread_id, question, attempt_count, llm_response):
+        """
+        Adds a thread that stopped at the human feedback interrupt, or updates
+        it with the new response after a regeneration (keeping its claim).
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("""
+                INSERT INTO pending_reviews (thread_id, question, attempt_count, response_preview, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (thread_id) DO UPDATE SET
+                    attempt_count = excluded.attempt_count,
+                    response_preview = excluded.response_preview,
+                    updated_at = excluded.updated_at
+            """, (thread_id, question, attempt_count, (llm_response or "")[:REVIEW_PREVIEW_LENGTH], now, now))
+
+    def mark_resolved(self, thread_id):
+        """Removes a thread that left the human feedback interrupt."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM pending_reviews WHERE thread_id = ?", (thread_id,))
+
+    def get(self, thread_id):
+        """Returns a pending thread as a dictionary, or None."""
+        with self.lock:
+            cursor = self.conn.execute("SELECT * FROM pending_reviews WHERE thread_id = ?", (thread_id,))
+            row = cursor.fetchone()
+            return self._to_dict(cursor, row) if row else None
+
+    def list_pending(self, page_size=REVIEW_PAGE_SIZE, cursor=None, unclaimed_only=False):
+        """
+        Lists pending threads, oldest first, one page at a time.
+
+        Args:
+            page_size: Maximum number of threads returned
+            cursor: next_cursor returned with the previous page
+            unclaimed_only: Skips threads with an active lease
+
+        Returns:
+            A tuple (threads, next_cursor), next_cursor being None on the last page
+        """
+        conditions = []
+        params = []
+        if cursor:
+            conditions.append("(created_at, thread_id) > (?, ?)")
+            params.extend(cursor)
+        if unclaimed_only:
+            conditions.append("(claimed_by IS NULL OR lease_expires_at < ?)")
+            params.append(time.time())
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            result = self.conn.execute(
+                f"SELECT * FROM pending_reviews {where} ORDER BY created_at, thread_id LIMIT ?",
+                params + [page_size + 1]
+            )
+            threads = [self._to_dict(result, row) for row in result.fetchall()]
+
+        next_cursor = None
+        if len(threads) > page_size:
+            threads = threads[:page_size]
+            next_cursor = (threads[-1]["created_at"], threads[-1]["thread_id"])
+
+        return threads, next_cursor
+
+    def claim(self, thread_id, reviewer, lease_seconds=REVIEW_LEASE_SECONDS):
+        """
+        Claims a thread for a reviewer. Succeeds if the thread is unclaimed,
+        its lease expired, or the reviewer already holds it (renewing the lease).
+
+        Returns:
+            True if the reviewer now holds the thread
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            result = self.conn.execute("""
+                UPDATE pending_reviews SET claimed_by = ?, lease_expires_at = ?
+                WHERE thread_id = ? AND (claimed_by IS NULL OR claimed_by = ? OR lease_expires_at < ?)
+            """, (reviewer, now + lease_seconds, thread_id, reviewer, now))
+        return result.rowcount == 1
+
+    def claim_next(self, reviewer, lease_seconds=REVIEW_LEASE_SECONDS):
+        """Claims the oldest available thread for a reviewer and returns it, or None."""
+        now = time.time()
+        with self.lock, self.conn:
+            # The write lock keeps two reviewers from claiming the same thread
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute("""
+                SELECT thread_id FROM pending_reviews
+                WHERE claimed_by IS NULL OR lease_expires_at < ?
+                ORDER BY created_at, thread_id LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE pending_reviews SET claimed_by = ?, lease_expires_at = ? WHERE thread_id = ?",
+                (reviewer, now + lease_seconds, row[0])
+            )
+        return self.get(row[0])
+
+    def release(self, thread_id, reviewer):
+        """Releases a reviewer's claim on a thread."""
+        with self.lock, self.conn:
+            result = self.conn.execute(
+                "UPDATE pending_reviews SET claimed_by = NULL, lease_expires_at = NULL WHERE thread_id = ? AND claimed_by = ?",
+                (thread_id, reviewer)
+            )
+        return result.rowcount == 1
+
+    def remove_stale(self, max_age=REVIEW_MAX_AGE_SECONDS, orphan_age=REVIEW_LEASE_SECONDS):
+        """
+        Removes abandoned threads that no reviewer holds: those not updated
+        for max_age seconds, and those still without a checkpoint after
+        orphan_age seconds (the run that added them never persisted its state).
+
+        Returns:
+            The number of threads removed
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            has_checkpoints = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'checkpoints'"
+            ).fetchone()
+            orphaned = "OR (updated_at < ? AND thread_id NOT IN (SELECT thread_id FROM checkpoints))" if has_checkpoints else ""
+            cursor = self.conn.execute(f"""
+                DELETE FROM pending_reviews
+                WHERE (claimed_by IS NULL OR lease_expires_at < ?) AND (updated_at < ? {orphaned})
+            """, [now, now - max_age] + ([now - orphan_age] if has_checkpoints else []))
+        return cursor.rowcount
@@ -0,0 +1,290 @@
+"""
+Service for the speculative work done while a response waits for human review.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    DEFAULT_NAMESPACE,
+    MAX_RETRY_ATTEMPTS,
+    SHORT_FEEDBACK_MAX_WORDS,
+    SPECULATION_DB_PATH,
+    SPECULATION_MAX_CALLS_PER_HOUR,
+    SPECULATION_MIN_RESPONSE_WORDS,
+    SPECULATION_MAX_WORKERS,
+    SPECULATION_WAIT_SECONDS,
+    SPECULATION_CONCISE_PHRASES,
+    SPECULATION_FILLER_WORDS
+)
+from services.embedding_cache import EmbeddingCache
+from services.prompt_builder import PromptBuilder
+from services.vector_db import VectorDBService
+
+# Variant generated for the "make it shorter" kind of feedback
+CONCISE = "concise"
+CONCISE_FEEDBACK = "Make the answer shorter and more concise, keeping the key information."
+
+# Longest phrases first, so "more concise" is matched before "concise"
+CONCISE_PATTERN = re.compile(
+    r"(?<![\w'])(?:"
+    + "|".join(re.escape(phrase) for phrase in sorted(SPECULATION_CONCISE_PHRASES, key=len, reverse=True))
+    + r")(?![\w'])"
+)
+FILLER_WORDS = set(SPECULATION_FILLER_WORDS)
+
+def is_concise_feedback(feedback):
+    """
+    Checks if the feedback asks for nothing but a shorter answer: it must
+    contain a shortening phrase, and every other word must be a filler word.
+    """
+    words = re.findall(r"[\w';]+", (feedback or "").lower())
+    if not words or len(words) > SHORT_FEEDBACK_MAX_WORDS:
+        return False
+    remainder, matches = CONCISE_PATTERN.subn(" ", " ".join(words))
+    return matches > 0 and all(word in FILLER_WORDS for word in remainder.split())
+
+def speculation_key(state, kind=CONCISE):
+    """Identifies the response under review a speculative variant was generated for."""
+    text = "\x00".join([kind, state["question"], state.get("llm_response", "")])
+    return hashlib.sha1(text.encode()).hexdigest()
+
+class SpeculationStore:
+    """
+    Speculative responses, stored in SQLite so a variant generated by one
+    worker process can be used by the one that runs the regeneration.
+    Status: pending -> ready -> used or discarded (or failed).
+    """
+    def __init__(self, db_path=SPECULATION_DB_PATH):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        # The connection is shared by the speculation threads and the graph's threads
+        self.lock = threading.Lock()
+        self._create_table()
+
+    def _create_table(self):
+        """Creates the table and its index if they don't exist."""
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS speculative_responses (
+                    speculation_key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    response TEXT,
+                    model TEXT,
+                    output_tokens INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_speculative_responses_created
+                    ON speculative_responses (created_at);
+            """)
+
+    def _to_dict(self, cursor, row):
+        return dict(zip([column[0] for column in cursor.description], row))
+
+    def start(self, key, kind, max_calls_per_hour=SPECULATION_MAX_CALLS_PER_HOUR):
+        """
+        Records a speculative call about to be made. Returns False when the
+        response already has one or the hourly cap (shared by all processes) is reached.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            # The write lock keeps concurrent processes from going over the cap
+            self.conn.execute("BEGIN IMMEDIATE")
+            calls = self.conn.execute(
+                "SELECT COUNT(*) FROM speculative_responses WHERE created_at > ?",
+                (now - 3600,)
+            ).fetchone()[0]
+            if calls >= max_calls_per_hour:
+                print("Speculation skipped: hourly cap reached")
+                return False
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO speculative_responses (speculation_key, kind, status, created_at, updated_at) "
+                "VALUES (?, ?, 'pending', ?, ?)",
+                (key, kind, now, now)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, key, response, model, output_tokens):
+        """Stores a speculative response, unless it was discarded in the meantime."""
+        with self.lock, self.conn:
+            self.conn.execute("""
+                UPDATE speculative_responses SET status = 'ready', response = ?, model = ?,
+                    output_tokens = ?, updated_at = ?
+                WHERE speculation_key = ? AND status = 'pending'
+            """, (response, model, output_tokens, time.time(), key))
+
+    def fail(self, key, error):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE speculative_responses SET status = 'failed', error = ?, updated_at = ? WHERE speculation_key = ?",
+                (error, time.time(), key)
+            )
+
+    def get(self, key):
+        """Returns a speculative response as a dictionary, or None."""
+        with self.lock:
+            cursor = self.conn.execute("SELECT * FROM speculative_responses WHERE speculation_key = ?", (key,))
+            row = cursor.fetchone()
+            return self._to_dict(cursor, row) if row else None
+
+    def wait(self, key, timeout=SPECULATION_WAIT_SECONDS, poll_interval=0.2):
+        """Waits while a speculative response is being generated and returns it (or None)."""
+        deadline = time.time() + timeout
+        while True:
+            speculation = self.get(key)
+            if speculation is None or speculation["status"] != "pending" or time.time() > deadline:
+                return speculation
+            time.sleep(poll_interval)
+
+    def mark_used(self, key):
+        """Marks a ready response as used. Returns False if it was already used or discarded."""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE speculative_responses SET status = 'used', updated_at = ? "
+                "WHERE speculation_key = ? AND status = 'ready'",
+                (time.time(), key)
+            )
+        return cursor.rowcount == 1
+
+    def discard(self, key):
+        """Discards a pending or ready response that won't be used."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE speculative_responses SET status = 'discarded', updated_at = ? "
+                "WHERE speculation_key = ? AND status IN ('pending', 'ready')",
+                (time.time(), key)
+            )
+
+    def get_stats(self, since=0):
+        """Returns the number of speculative calls and output tokens per status."""
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT status, COUNT(*), COALESCE(SUM(output_tokens), 0) FROM speculative_responses
+                WHERE created_at >= ? GROUP BY status
+            """, (since,)).fetchall()
+        return {status: {"calls": calls, "output_tokens": tokens} for status, calls, tokens in rows}
+
+class SpeculationService:
+    """
+    Uses the time a response waits for review: prefetches the embeddings the
+    storage needs if it is validated, and generates a concise variant that the
+    regeneration uses when the feedback only asks for a shorter answer.
+    Variants that don't match the feedback are discarded.
+    """
+    def __init__(self, vector_db_service=None, store=None, max_workers=SPECULATION_MAX_WORKERS):
+        self.vector_db_service = vector_db_service or VectorDBService(cache_embeddings=True)
+        self.store = store or SpeculationStore()
+        self.prompt_builder = PromptBuilder()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculation")
+        # Work is skipped, not queued, when every worker is busy
+        self.slots = threading.BoundedSemaphore(max_workers)
+
+    def speculate(self, state, regenerate):
+        """
+        Starts the speculative work for a response waiting for review, in the background.
+
+        Args:
+            state: State of the thread stopped at the human feedback interrupt
+            regenerate: Function (state, feedback) -> (response, model) that
+                regenerates the response (RegenerateResponseNode.regenerate)
+        """
+        if not self.slots.acquire(blocking=False):
+            print("Speculation skipped: all speculation workers are busy")
+            return None
+
+        def run():
+            try:
+                self._prefetch(state, regenerate)
+            except Exception as e:
+                print(f"Warning: Error in speculative prefetch: {e}")
+            finally:
+                self.slots.release()
+
+        return self.executor.submit(run)
+
+    def _should_generate_concise(self, state):
+        """A variant is only worth it for long responses that can still be regenerated."""
+        if len(state.get("feedback_history", [])) + 1 >= MAX_RETRY_ATTEMPTS:
+            return False
+        return len(state.get("llm_response", "").split()) >= SPECULATION_MIN_RESPONSE_WORDS
+
+    def _prefetch(self, state, regenerate):
+        namespace = state.get("namespace") or DEFAULT_NAMESPACE
+        response = state.get("llm_response", "")
+        self.vector_db_service.prefetch_embeddings([response, state["question"]], namespace)
+
+        if not self._should_generate_concise(state):
+            return
+
+        key = speculation_key(state)
+        if not self.store.start(key, CONCISE):
+            return
+        try:
+            concise_response, model = regenerate(state, CONCISE_FEEDBACK)
+        except Exception as e:
+            self.store.fail(key, str(e))
+            raise
+
+        self.store.complete(key, concise_response, model, self.prompt_builder.count_tokens(concise_response, model))
+        self.vector_db_service.prefetch_embeddings([concise_response], namespace)
+
+    def take(self, state, feedback):
+        """
+        Returns the speculative (response, model) for the feedback on the
+        response in the state, or None. A variant that doesn't match the
+        feedback is discarded.
+        """
+        key = speculation_key(state)
+        if not is_concise_feedback(feedback):
+            self.store.discard(key)
+            return None
+
+        speculation = self.store.wait(key)
+        if speculation and speculation["status"] == "ready" and self.store.mark_used(key):
+            return speculation["response"], speculation["model"]
+
+        self.store.discard(key)
+        return None
+
+    def discard(self, state):
+        """Discards the speculative work for a response that won't be regenerated."""
+        self.store.discard(speculation_key(state))
+
+    def get_stats(self, since=0):
+        """
+        Returns the hit rates: the share of resolved variants that were used,
+        and of prefetched embeddings that were read back.
+        """
+        responses = self.store.get_stats(since)
+        used = responses.get("used", {"calls": 0, "output_tokens": 0})
+        discarded = responses.get("discarded", {"calls": 0, "output_tokens": 0})
+        resolved = used["calls"] + discarded["calls"]
+
+        embeddings = EmbeddingCache().get_stats()
+
+        return {
+            "responses": responses,
+            "response_hit_rate": used["calls"] / resolved if resolved else None,
+            "wasted_output_tokens": discarded["output_tokens"],
+            "embeddings": embeddings,
+            "embedding_hit_rate": embeddings["used"] / embeddings["prefetched"] if embeddings["prefetched"] else None
+        }
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+def get_speculation_service():
+    """
+    Returns the SpeculationService shared by every graph of the process, so
+    its workers and connections are created once instead of per graph.
+    """
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is None:
+            _shared_service = SpeculationService()
+        return _shared_service
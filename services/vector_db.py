@@ -1,24 +1,123 @@
 """
 Service for handling the vector database.
 """
+from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
+import chromadb
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import re
+import time
 import uuid
 import types
-from config import OPENAI_API_KEY, VECTOR_DB_PATH, SIMILARITY_THRESHOLD, MAX_SIMILAR_RESULTS
+from config import (
+    OPENAI_API_KEY,
+    VECTOR_DB_PATH,
+    SIMILARITY_THRESHOLD,
+    MAX_SIMILAR_RESULTS,
+    ALIAS_SEARCH_FACTOR,
+    DEFAULT_NAMESPACE,
+    LEGACY_NAMESPACE,
+    DEFAULT_COLLECTION_NAME,
+    NAMESPACE_COLLECTION_PREFIX,
+    MAX_PARALLEL_NAMESPACE_SEARCHES,
+    EMBEDDING_MODEL,
+    LEGACY_EMBEDDING_MODEL,
+    SPECULATION_ENABLED,
+    ANSWER_INDEX_ENABLED,
+    ANSWER_INDEX_DTYPE,
+    ACTIVE_COLLECTION_CHECK_INTERVAL
+)
+from services.embedding_registry import get_registry
+from services.embedding_cache import EmbeddingCache, CachedEmbeddings
+from services.answer_index import get_answer_index
+
+def collection_name_for_namespace(namespace):
+    """
+    Maps a namespace to its Chroma collection name.
+    Chroma accepts 3-63 characters from [a-zA-Z0-9._-], starting and ending
+    with an alphanumeric character.
+    """
+    if not namespace or namespace == LEGACY_NAMESPACE:
+        return DEFAULT_COLLECTION_NAME
+
+    slug = re.sub(r"[^a-zA-Z0-9._-]+", "-", namespace.strip().lower()).strip("._-")
+    if not slug:
+        raise ValueError(f"Invalid namespace: '{namespace}'")
+
+    return f"{NAMESPACE_COLLECTION_PREFIX}{slug}"[:63].rstrip("._-")
+
+def shadow_collection_name(collection_name, embedding_model):
+    """Returns the name of the collection that holds a re-embedded copy of a collection."""
+    model_slug = re.sub(r"[^a-zA-Z0-9._-]+", "-", embedding_model.lower()).strip("._-")
+    return f"{collection_name[:40].rstrip('._-')}__{model_slug}"[:63].rstrip("._-")
 
 class VectorDBService:
-    def __init__(self):
-        self.db = self._initialize_vector_db()
+    def __init__(self, namespace=DEFAULT_NAMESPACE, cache_embeddings=SPECULATION_ENABLED,
+                 use_answer_index=ANSWER_INDEX_ENABLED):
+        self.namespace = namespace or DEFAULT_NAMESPACE
+        self.registry = get_registry()
+        # Searches read the memory-mapped snapshot instead of opening Chroma when it is up to date
+        self.answer_index = get_answer_index() if use_answer_index else None
+        # Prefetched document embeddings (see prefetch_embeddings)
+        self.embedding_cache = EmbeddingCache() if cache_embeddings else None
+        self.embeddings = {}
+        self.collections = {}
+        # namespace -> ((collection_name, embedding_model), time it was read from the registry)
+        self.active_collections = {}
     
-    def _initialize_vector_db(self):
+    @property
+    def db(self):
+        """Vector database of the service's namespace."""
+        return self._get_db(self.namespace)
+
+    def _get_db(self, namespace=None):
+        """
+        Returns the vector database for a namespace, opening it on first use
+        and again when its active collection changed (see _get_active_collection).
+        """
+        namespace = namespace or self.namespace
+        self._get_active_collection(namespace)
+        if namespace not in self.collections:
+            self.collections[namespace] = self._initialize_vector_db(namespace)
+        return self.collections[namespace]
+
+    def get_embeddings(self, embedding_model):
+        """Returns the embedding function for a model, creating it on first use."""
+        if embedding_model not in self.embeddings:
+            embeddings = OpenAIEmbeddings(model=embedding_model)
+            if self.embedding_cache:
+                embeddings = CachedEmbeddings(embeddings, embedding_model, self.embedding_cache)
+            self.embeddings[embedding_model] = embeddings
+        return self.embeddings[embedding_model]
+
+    def prefetch_embeddings(self, texts, namespace=None):
+        """
+        Computes the embeddings of texts that may be stored in a namespace soon
+        (e.g. a response waiting for review and its question), so storing them
+        doesn't wait for the embedding API. Only done when the cache is enabled.
+        """
+        if not self.embedding_cache:
+            return
+        # The model comes from the registry, so Chroma isn't opened before the answer is stored
+        _, embedding_model = self._get_active_collection(namespace or self.namespace)
+        self.get_embeddings(embedding_model).prefetch(texts)
+
+    def open_collection(self, collection_name, embedding_model):
+        """Opens a Chroma collection with the embedding model its vectors were built with."""
+        return Chroma(
+            collection_name=collection_name,
+            persist_directory=VECTOR_DB_PATH,
+            embedding_function=self.get_embeddings(embedding_model)
+        )
+
+    def _initialize_vector_db(self, namespace=DEFAULT_NAMESPACE):
         """Initializes the vector database or creates a mock if there's an error."""
         try:
-            embeddings = OpenAIEmbeddings()
-            vector_db = Chroma(
-                persist_directory=VECTOR_DB_PATH,
-                embedding_function=embeddings
-            )
+            collection_name, embedding_model = self._get_active_collection(namespace)
+            vector_db = self.open_collection(collection_name, embedding_model)
+            vector_db.embedding_model = embedding_model
             
             # Adds compatibility method if necessary
             if not hasattr(vector_db, 'similarity_search_with_score'):
@@ -41,7 +140,7 @@ class VectorDBService:
     def _create_mock_db(self):
         """Creates a mock of the vector database for when there are initialization errors."""
         class MockVectorDB:
-            def add_texts(self, texts, metadatas=None):
+            def add_texts(self, texts, metadatas=None, ids=None):
                 print("Simulating text storage in the database.")
                 return ["mock_id"]
             
@@ -55,14 +154,157 @@ class VectorDBService:
         
         return MockVectorDB()
     
-    def search_similar_responses(self, question, k=MAX_SIMILAR_RESULTS, 
-                                similarity_threshold=SIMILARITY_THRESHOLD):        
+    def _collection_has_documents(self, collection_name):
+        """Checks if a Chroma collection already exists with documents in it."""
         try:
-            results = self.db.similarity_search_with_score(
+            return chromadb.PersistentClient(path=VECTOR_DB_PATH).get_collection(collection_name).count() > 0
+        except Exception:
+            return False
+
+    def get_active_collection(self, namespace):
+        """
+        Returns (collection_name, embedding_model) of a namespace from the registry.
+        Collections that existed before the registry are registered with the
+        legacy model their vectors were built with, new ones with EMBEDDING_MODEL.
+        """
+        active = self.registry.find_active(namespace)
+        if active:
+            return active
+        collection_name = collection_name_for_namespace(namespace)
+        default_model = LEGACY_EMBEDDING_MODEL if self._collection_has_documents(collection_name) else EMBEDDING_MODEL
+        return self.registry.get_active(namespace, collection_name, default_model)
+
+    def _get_active_collection(self, namespace, max_age=ACTIVE_COLLECTION_CHECK_INTERVAL):
+        """
+        Returns the active collection of a namespace, read again from the
+        registry once the cached one is older than max_age seconds. When a
+        re-embedding switched it, the collection opened for the namespace is
+        dropped so long-lived services follow the switch.
+        """
+        cached = self.active_collections.get(namespace)
+        if cached and time.monotonic() - cached[1] < max_age:
+            return cached[0]
+
+        active = self.get_active_collection(namespace)
+        if cached and cached[0] != active:
+            self.collections.pop(namespace, None)
+        self.active_collections[namespace] = (active, time.monotonic())
+        return active
+
+    def _get_snapshot(self, namespace):
+        """Returns the answer index snapshot of a namespace, or None to search Chroma."""
+        if not self.answer_index:
+            return None
+        try:
+            return self.answer_index.open(collection_name_for_namespace(namespace), *self._get_active_collection(namespace))
+        except Exception as e:
+            print(f"Warning: Error opening the answer index: {e}")
+            return None
+
+    def _search_namespace(self, namespace, question, k, query_embeddings=None):
+        """
+        Searches the validated responses of a single namespace. query_embeddings
+        maps embedding models to the question's embedding, so a question searched
+        in several namespaces is only embedded once per model.
+        """
+        query_embeddings = query_embeddings or {}
+        snapshot = self._get_snapshot(namespace)
+        if snapshot:
+            query_embedding = query_embeddings.get(snapshot.embedding_model) or \
+                self.get_embeddings(snapshot.embedding_model).embed_query(question)
+            results = snapshot.similarity_search_by_vector_with_score(
+                query_embedding,
+                k=k * ALIAS_SEARCH_FACTOR,
+                filter={"validated": True}
+            )
+            return self._resolve_aliases(snapshot, results)[:k]
+
+        db = self._get_db(namespace)
+        query_embedding = query_embeddings.get(getattr(db, "embedding_model", None))
+        if query_embedding and hasattr(db, "similarity_search_by_vector_with_relevance_scores"):
+            # Chroma returns the same distances as similarity_search_with_score
+            results = db.similarity_search_by_vector_with_relevance_scores(
+                query_embedding,
+                k=k * ALIAS_SEARCH_FACTOR,
+                filter={"validated": True}
+            )
+        else:
+            results = db.similarity_search_with_score(
                 query=question,
-                k=k,
+                k=k * ALIAS_SEARCH_FACTOR,
                 filter={"validated": True}
             )
+        return self._resolve_aliases(db, results)[:k]
+    
+    def _resolve_aliases(self, db, results):
+        """
+        Replaces alias matches with the answer they point to, keeping the
+        matched alias as the question, and keeps only the best match per answer.
+        The resolved documents carry the answer's id in metadata["answer_id"].
+        """
+        alias_ids = list({doc.metadata["alias_of"] for doc, _ in results if doc.metadata.get("alias_of")})
+        answers = {}
+        if alias_ids and hasattr(db, "get"):
+            fetched = db.get(ids=alias_ids, include=["documents", "metadatas"])
+            answers = {
+                answer_id: (document, metadata or {})
+                for answer_id, document, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+            }
+        
+        resolved = []
+        seen = set()
+        for doc, score in sorted(results, key=lambda result: result[1]):
+            alias_of = doc.metadata.get("alias_of")
+            answer_id = alias_of or getattr(doc, "id", None) or doc.metadata.get("id")
+            if answer_id in seen or (alias_of and alias_of not in answers):
+                continue
+            seen.add(answer_id)
+            
+            if alias_of:
+                answer, answer_metadata = answers[alias_of]
+                metadata = {**answer_metadata, "question": doc.metadata.get("question", ""), "answer_id": answer_id}
+                resolved.append((Document(page_content=answer, metadata=metadata), score))
+            else:
+                resolved.append((Document(page_content=doc.page_content, metadata={**doc.metadata, "answer_id": answer_id}), score))
+        
+        return resolved
+
+    def search_similar_responses(self, question, k=MAX_SIMILAR_RESULTS, 
+                                similarity_threshold=SIMILARITY_THRESHOLD,
+                                namespaces=None):
+        """
+        Searches for similar validated responses.
+
+        Only the service's namespace is searched by default. When several
+        namespaces are given, they are searched in parallel and the top-k
+        results are merged by score (lower is more similar).
+        """
+        namespaces = list(dict.fromkeys(namespaces or [self.namespace]))
+
+        try:
+            if len(namespaces) == 1:
+                results = self._search_namespace(namespaces[0], question, k)
+            else:
+                # Opens the collections up front so worker threads don't race on the cache,
+                # and embeds the question once per embedding model of the namespaces
+                query_embeddings = {}
+                for namespace in namespaces:
+                    snapshot = self._get_snapshot(namespace)
+                    embedding_model = snapshot.embedding_model if snapshot else \
+                        getattr(self._get_db(namespace), "embedding_model", None)
+                    if embedding_model and embedding_model not in query_embeddings:
+                        query_embeddings[embedding_model] = self.get_embeddings(embedding_model).embed_query(question)
+
+                workers = min(len(namespaces), MAX_PARALLEL_NAMESPACE_SEARCHES)
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    shard_results = executor.map(
+                        lambda namespace: self._search_namespace(namespace, question, k, query_embeddings),
+                        namespaces
+                    )
+                    results = sorted(
+                        (result for shard in shard_results for result in shard),
+                        key=lambda result: result[1]
+                    )[:k]
             
             relevant_results = []
             for doc, score in results:
@@ -76,26 +318,117 @@ class VectorDBService:
             print(f"Warning: Error searching for similar responses: {e}")
             return []
     
-    def add_validated_response(self, question, response, feedback_notes="", original_question="", from_database=False):
-        """Adds a validated response to the database."""
+    def _add_to_running_migration(self, namespace, document, metadata, doc_id, collection_name):
+        """
+        Writes a new answer to the shadow collection too while a re-embedding
+        is running, so that it is not lost when reads switch over. The same is
+        done when the re-embedding completed after the answer's collection
+        (collection_name) was read from the registry.
+        """
+        try:
+            migration = self.registry.get_migration(namespace)
+            if migration is None or migration["target_collection"] == collection_name:
+                return
+            if migration["status"] != "running" and migration["source_collection"] != collection_name:
+                return
+            
+            self.open_collection(migration["target_collection"], migration["target_model"]).add_texts(
+                texts=[document],
+                metadatas=[{**metadata, "embedding_model": migration["target_model"]}],
+                ids=[doc_id]
+            )
+        except Exception as e:
+            print(f"Warning: Error writing to the re-embedding collection: {e}")
+    
+    def refresh_answer_index(self, namespace=None, dtype=ANSWER_INDEX_DTYPE, full=False, compact=False):
+        """
+        Updates the answer index snapshot of a namespace from its active Chroma
+        collection (see AnswerIndex.build). Returns the number of indexed documents.
+        Run it outside the request path (build_answer_index.py).
+        """
+        namespace = namespace or self.namespace
+        # Read again so a re-embedding completed by another process is picked up
+        collection_name, embedding_model = self.get_active_collection(namespace)
+        db = self.open_collection(collection_name, embedding_model)
+        return (self.answer_index or get_answer_index()).build(
+            collection_name_for_namespace(namespace), db, collection_name, embedding_model,
+            dtype=dtype, full=full, compact=compact
+        )
+
+    def add_alias(self, answer_id, question, namespace=None):
+        """
+        Indexes a question as another way into a stored answer. The alias is
+        embedded and searchable on its own, and resolves to the answer body.
+        """
+        namespace = namespace or self.namespace
+        # Read again so a write never lands in a collection a re-embedding retired
+        collection_name, _ = self._get_active_collection(namespace, max_age=0)
+        db = self._get_db(namespace)
+        
+        normalized_question = " ".join(question.lower().split())
+        alias_id = f"{answer_id}-alias-{hashlib.sha1(normalized_question.encode()).hexdigest()[:16]}"
+        metadata = {
+            "question": question,
+            "validated": True,
+            "alias_of": answer_id,
+            "namespace": namespace,
+            "embedding_model": getattr(db, "embedding_model", EMBEDDING_MODEL)
+        }
+        
+        # The id only depends on the answer and the question, so adding an alias twice overwrites it
+        db.add_texts(texts=[question], metadatas=[metadata], ids=[alias_id])
+        self._add_to_running_migration(namespace, question, metadata, alias_id, collection_name)
+    
+    def add_validated_response(self, question, response, feedback_notes="", original_question="", from_database=False,
+                               namespace=None, answer_id=None, source_answer_id=None):
+        """
+        Adds a validated response to the database, with the question as its first alias.
+        When answer_id is given, the response is that stored answer served unchanged,
+        so the question is only added as one of its aliases. source_answer_id links
+        a new answer to the stored answer it was adapted or regenerated from.
+        """
+        namespace = namespace or self.namespace
+        
+        if answer_id:
+            try:
+                self.add_alias(answer_id, question, namespace)
+                return True
+            except Exception as e:
+                print(f"Error saving question alias to the database: {e}")
+                return False
+
+        # Read again so a write never lands in a collection a re-embedding retired
+        collection_name, _ = self._get_active_collection(namespace, max_age=0)
+        db = self._get_db(namespace)
+        
         final_document = response
         if feedback_notes:
             final_document += f"\n\nAdditional observations: {feedback_notes}"
         
+        doc_id = str(uuid.uuid4())
+        metadata = {
+            "question": question,
+            "validated": True,
+            "id": doc_id,
+            "adapted_from": original_question if from_database else "",
+            "source_answer_id": source_answer_id or "",
+            "namespace": namespace,
+            "embedding_model": getattr(db, "embedding_model", EMBEDDING_MODEL)
+        }
+        
         try:
-            self.db.add_texts(
+            db.add_texts(
                 texts=[final_document],
-                metadatas=[{
-                    "question": question,
-                    "validated": True,
-                    "id": str(uuid.uuid4()),
-                    "adapted_from": original_question if from_database else ""
-                }]
+                metadatas=[metadata],
+                ids=[doc_id]
             )
             
+            self._add_to_running_migration(namespace, final_document, metadata, doc_id, collection_name)
+            self.add_alias(doc_id, question, namespace)
+            
             # Tries to persist the database
-            if hasattr(self.db, 'persist'):
-                self.db.persist()
+            if hasattr(db, 'persist'):
+                db.persist()
             else:
                 pass
                 # print("Warning: The 'persist' method is not available in this version of Chroma.")
@@ -105,4 +438,4 @@ class VectorDBService:
         except Exception as e:
             print(f"Error saving response to the database: {e}")
             print("The response was processed, but may not have been persisted.")
-            return False
\ No newline at end of file
+            return False
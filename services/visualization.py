@@ -1,15 +1,86 @@
 """
 Service for flow graph visualization.
 """
+import hashlib
+import json
+import os
+from config import GRAPH_IMAGE_PATH
 
 class VisualizationService:
     @staticmethod
-    def generate_graph_image(graph, output_path="qa_feedback_graph.png"):
-        """Generates an image of the graph using mermaid."""
+    def get_topology_hash(graph):
+        """Returns a hash of the graph's nodes and edges."""
+        drawable = graph.get_graph()
+        topology = {
+            "nodes": sorted(drawable.nodes.keys()),
+            "edges": sorted(
+                [edge.source, edge.target, str(edge.data), bool(edge.conditional)]
+                for edge in drawable.edges
+            )
+        }
+        return hashlib.sha256(json.dumps(topology, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def _is_recorded(hash_path, output_path, topology_hash):
+        """Checks if an output exists and was generated for the topology hash."""
+        if not os.path.exists(output_path) or not os.path.exists(hash_path):
+            return False
+        with open(hash_path) as hash_file:
+            return hash_file.read().strip() == topology_hash
+
+    @staticmethod
+    def _record(hash_path, topology_hash):
+        with open(hash_path, "w") as hash_file:
+            hash_file.write(topology_hash)
+
+    @staticmethod
+    def generate_graph_image(graph, output_path=GRAPH_IMAGE_PATH, allow_remote=False, force=False):
+        """
+        Generates the graph visualization without network access by default:
+        - Mermaid text is always written next to the image (.mmd)
+        - The PNG is rendered locally with Graphviz when pygraphviz is installed
+        - The remote mermaid.ink renderer is only used when allow_remote is set
+
+        The topology hash of each output is recorded next to it (.sha256 for
+        the Mermaid text, .png.sha256 for the image), and an output is only
+        generated again when the graph's nodes or edges change.
+        """
+        base_path = os.path.splitext(output_path)[0]
+        mermaid_path = f"{base_path}.mmd"
+        mermaid_hash_path = f"{base_path}.sha256"
+        image_hash_path = f"{output_path}.sha256"
+
         try:
-            graph.get_graph().draw_mermaid_png(output_file_path=output_path)
-            print(f"Visualization saved as '{output_path}'")
+            topology_hash = VisualizationService.get_topology_hash(graph)
+            drawable = None
+
+            mermaid_changed = force or not VisualizationService._is_recorded(mermaid_hash_path, mermaid_path, topology_hash)
+            if mermaid_changed:
+                drawable = graph.get_graph()
+                with open(mermaid_path, "w") as mermaid_file:
+                    mermaid_file.write(drawable.draw_mermaid())
+                VisualizationService._record(mermaid_hash_path, topology_hash)
+                print(f"Mermaid diagram saved as '{mermaid_path}'")
+
+            if not force and VisualizationService._is_recorded(image_hash_path, output_path, topology_hash):
+                print(f"Visualization is up to date ('{output_path}')")
+                return True
+
+            drawable = drawable or graph.get_graph()
+            try:
+                drawable.draw_png(output_file_path=output_path)
+                print(f"Visualization saved as '{output_path}'")
+            except ImportError:
+                if not allow_remote:
+                    # Only mentioned when the topology changed, not on every build
+                    if mermaid_changed:
+                        print("Install pygraphviz to render the PNG locally, or allow remote rendering.")
+                    return True
+                drawable.draw_mermaid_png(output_file_path=output_path)
+                print(f"Visualization saved as '{output_path}' (rendered by mermaid.ink)")
+
+            VisualizationService._record(image_hash_path, topology_hash)
             return True
         except Exception as e:
             print(f"Error on generating visualization: {e}")
-            return False
\ No newline at end of file
+            return False
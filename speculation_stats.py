@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Script to show how much of the speculative work done during reviews was used.
+"""
+import argparse
+import time
+from services.speculation import SpeculationService
+
+def percent(value):
+    return "n/a" if value is None else f"{value * 100:.1f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description="Shows the hit rates of the speculative work done during reviews.")
+    parser.add_argument("--hours", type=float, help="Only counts variants generated in the last hours (default: all)")
+    args = parser.parse_args()
+
+    since = time.time() - args.hours * 3600 if args.hours else 0
+    stats = SpeculationService().get_stats(since)
+
+    print("Concise variants:")
+    for status, counts in sorted(stats["responses"].items()):
+        print(f"  {status:<10} calls={counts['calls']:<5} output tokens={counts['output_tokens']}")
+    print(f"  Hit rate: {percent(stats['response_hit_rate'])} "
+          f"(output tokens of discarded variants: {stats['wasted_output_tokens']})")
+
+    embeddings = stats["embeddings"]
+    # Prefetched embeddings are only kept for SPECULATION_TTL_SECONDS
+    print(f"\nPrefetched embeddings: {embeddings['prefetched']}, used: {embeddings['used']}")
+    print(f"  Hit rate: {percent(stats['embedding_hit_rate'])}")
+
+if __name__ == "__main__":
+    main()
@@ -2,29 +2,39 @@
 Helper functions for the QA system with feedback.
 """
 import uuid
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+from config import DEFAULT_NAMESPACE
 
-def create_initial_state(question: str) -> Dict[str, Any]:
+def create_initial_state(question: str, namespace: str = DEFAULT_NAMESPACE,
+                         search_namespaces: Optional[List[str]] = None) -> Dict[str, Any]:
     """
     Creates the initial state for the workflow.
     
     Args:
         question: The user's question
+        namespace: Knowledge base namespace where validated answers are stored
+        search_namespaces: Namespaces to search in parallel (defaults to namespace only)
         
     Returns:
         A dictionary with the initial state
     """
     return {
         "question": question,
+        "namespace": namespace,
+        "search_namespaces": search_namespaces or [namespace],
         "llm_response": "",
+        "llm_model": "",
         "human_feedback": "",
         "is_validated": False,
         "previous_responses": [],
         "feedback_notes": "",
+        "feedback_history": [],
         "from_database": False,
         "adapted_response": "",
         "original_question": "",
-        "is_identical": False
+        "answer_id": "",
+        "is_identical": False,
+        "is_near_duplicate": False
     }
 
 def create_thread_config() -> Dict[str, Any]:
@@ -43,8 +53,8 @@ def format_display_response(response: str, source_type: str, original_question:
     
     Args:
         response: The response to be displayed
-        source_type: The source type ("database", "adapted", "generated")
-        original_question: The original question (only for adapted responses)
+        source_type: The source type ("database", "near_duplicate", "adapted", "generated")
+        original_question: The original question (for near-duplicate and adapted responses)
         
     Returns:
         The formatted response for display
@@ -54,6 +64,8 @@ def format_display_response(response: str, source_type: str, original_question:
     
     if source_type == "database":
         return f"{header}{response}{footer}\n\nExact correspondence for your question!"
+    elif source_type == "near_duplicate":
+        return f"{header}{response}{footer}\n\nStored answer to a reworded question: '{original_question}'"
     elif source_type == "adapted":
         return f"Adapted answer:\n {response}"
     else:
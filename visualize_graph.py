@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Script to generate the flow graph visualization.
+Writes the Mermaid diagram and, when possible, a PNG rendered locally.
+"""
+import argparse
+from config import GRAPH_IMAGE_PATH
+from graph.builder import GraphBuilder
+from services.visualization import VisualizationService
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates the flow graph visualization.")
+    parser.add_argument("--output", default=GRAPH_IMAGE_PATH, help=f"Image path (default: {GRAPH_IMAGE_PATH})")
+    parser.add_argument("--remote", action="store_true",
+                        help="Renders the PNG with mermaid.ink when pygraphviz is not installed")
+    parser.add_argument("--force", action="store_true", help="Renders even if the topology did not change")
+    args = parser.parse_args()
+
+    graph = GraphBuilder(visualize=False).build()
+    VisualizationService.generate_graph_image(graph, args.output, allow_remote=args.remote, force=args.force)
+
+if __name__ == "__main__":
+    main()
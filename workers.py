@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Script to start the worker processes that run the queued graph jobs.
+Results are written to the checkpoint database. Jobs of a worker that
+stops are picked up by the others once their lease expires.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+from langgraph.types import Command
+from config import WORKER_COUNT, JOB_POLL_INTERVAL
+from graph.builder import GraphBuilder
+from services.job_queue import JobQueue, GENERATE
+
+def is_waiting_for_feedback(state):
+    return "get_human_feedback" in (state.next or ())
+
+def process_job(builder, job, job_queue, worker_id):
+    """
+    Runs a job on its thread. Jobs already applied by a worker that stopped
+    before marking them done are not run again: a run that was cut short is
+    completed instead. Nothing is run once the worker lost the job's lease.
+    """
+    if not job_queue.renew(job["job_id"], worker_id):
+        print(f"Warning: Worker {worker_id} no longer holds job {job['job_id']}, skipping it")
+        return
+    thread = {"configurable": {"thread_id": job["thread_id"]}}
+    state = builder.graph.get_state(thread)
+    checkpoint_id = state.config["configurable"].get("checkpoint_id") if state.values else None
+
+    if job["kind"] == GENERATE and not state.values:
+        builder.run(job["payload"], thread)
+    elif job["kind"] != GENERATE and checkpoint_id == job["expected_checkpoint_id"]:
+        builder.run(Command(resume=job["payload"]), thread)
+    elif state.next and not is_waiting_for_feedback(state):
+        builder.run(None, thread)
+
+def run_worker(worker_number):
+    """Claims and runs jobs until the process is stopped."""
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{worker_number}"
+    job_queue = JobQueue()
+    builder = GraphBuilder()
+    builder.build()
+    print(f"Worker {worker_id} started")
+
+    while True:
+        job = job_queue.claim(worker_id)
+        if job is None:
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+
+        print(f"Worker {worker_id}: {job['kind']} job for thread {job['thread_id']}")
+        try:
+            with job_queue.heartbeat(job["job_id"], worker_id):
+                process_job(builder, job, job_queue, worker_id)
+            if not job_queue.complete(job["job_id"], worker_id):
+                # The job was reclaimed, and its new owner won't apply it twice to the thread
+                print(f"Warning: Worker {worker_id} lost job {job['job_id']}, dropping its result")
+        except Exception as e:
+            traceback.print_exc()
+            if not job_queue.fail(job["job_id"], worker_id, str(e)):
+                print(f"Warning: Worker {worker_id} lost job {job['job_id']}, not queuing it again")
+
+def main():
+    parser = argparse.ArgumentParser(description="Starts worker processes for the queued graph jobs.")
+    parser.add_argument("--workers", type=int, default=WORKER_COUNT, help=f"Number of processes (default: {WORKER_COUNT})")
+    args = parser.parse_args()
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(number,), daemon=True)
+        for number in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("\nStopping workers...")
+
+if __name__ == "__main__":
+    main()